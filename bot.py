@@ -4,12 +4,22 @@ from dotenv import load_dotenv
 import os
 import asyncio
 
+from utils.dispatcher import MessageDispatcher
+from utils.http import create_http_session
+from utils.perf import Instrumentation
+from utils.storage import Storage
+from utils.webhooks import WebhookDispatcher
+
 # .envからトークン読み込み
 load_dotenv(dotenv_path="ci/.env")
 TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 if TOKEN is None:
     raise ValueError("DISCORD_BOT_TOKEN が見つかりません")
 
+# イベントループの停止検出（重い同期処理の洗い出し用）
+LOOP_WATCHDOG = os.getenv("LOOP_WATCHDOG", "0") == "1"
+LOOP_WATCHDOG_THRESHOLD_MS = int(os.getenv("LOOP_WATCHDOG_THRESHOLD_MS", "100"))
+
 # Intents
 intents = discord.Intents.all()
 
@@ -20,10 +30,36 @@ class MyBot(commands.Bot):
             intents=intents,
             help_command=None
         )
+        # 全Cogで共有するSQLiteコネクション
+        self.storage = Storage()
+        # 全Cogで共有するHTTPセッション（setup_hook で作成）
+        self.http_session = None
+        self.webhooks = None
+        # on_message は dispatcher が一括で受けて各Cogへ振り分ける
+        self.dispatcher = MessageDispatcher()
+        self.add_listener(self.dispatcher.dispatch, "on_message")
+        # リスナー・コマンドごとの実行時間とイベントループ遅延
+        self.instrumentation = Instrumentation(self)
+
+    async def add_cog(self, cog, **kwargs):
+        await super().add_cog(cog, **kwargs)
+        # 起動後に再読み込みされたCogのリスナーも計測対象にする
+        if self.instrumentation.installed:
+            self.instrumentation.wrap_listeners()
 
     async def setup_hook(self):
         failed_cogs = []
 
+        # Cogの読み込み中の停止も拾えるよう最初に起動する
+        if LOOP_WATCHDOG:
+            self.instrumentation.start_watchdog(LOOP_WATCHDOG_THRESHOLD_MS / 1000)
+            print(f"✅ ループ停止検出: {LOOP_WATCHDOG_THRESHOLD_MS}ms 以上で記録 - {self.user}")
+
+        # 接続を使い回すHTTPセッション（Cogの cog_load から使えるよう先に作る）
+        self.http_session = create_http_session()
+        # Webhook送信はURLごとのキューを通す
+        self.webhooks = WebhookDispatcher(self.http_session)
+
         # --- Cogをまとめてロード ---
         for folder in ("./cogs", "./SSP"):
             for root, _, files in os.walk(folder):
@@ -48,6 +84,9 @@ class MyBot(commands.Bot):
         else:
             print(f"✅ すべてのFileのロードに成功しました - {self.user}")
 
+        # --- 計測の開始 ---
+        self.instrumentation.install()
+
         # --- スラッシュコマンド同期 ---
         synced = await self.tree.sync()
         print(f"✅ スラッシュコマンド登録数: {len(synced)} - {self.user}")
@@ -55,10 +94,22 @@ class MyBot(commands.Bot):
     async def on_ready(self):
         print(f"✅ ログイン完了: {self.user}")
 
+    async def close(self):
+        # Cogのアンロード（書き込み待ちのフラッシュ）が終わってからDBを閉じる
+        await super().close()
+        await self.instrumentation.close()
+        if self.webhooks:
+            await self.webhooks.close()
+        if self.http_session:
+            await self.http_session.close()
+        await self.storage.close()
+
 # --- 起動処理 ---
 async def main():
     bot = MyBot()
-    await bot.start(TOKEN)
+    # Ctrl-C で止めたときも close()（バッファのフラッシュ・DBのクローズ）まで通す
+    async with bot:
+        await bot.start(TOKEN)
 
 if __name__ == "__main__":
     try:
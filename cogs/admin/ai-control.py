@@ -12,7 +12,31 @@ class TalkControlCog(commands.Cog):
     @commands.command(name="ai_status")
     async def ai_status(self, ctx):
         status = "🟢 **稼働中**" if self.bot.talk_enabled else "🔴 **緊急停止中**"
-        await ctx.reply(f"現在のAI状態：{status}", mention_author=False)
+        lines = [f"現在のAI状態：{status}"]
+
+        talk = self.bot.get_cog("TalkCog")
+        if talk is not None:
+            p = talk.prompts.stats.summary()
+            lines.append(
+                f"プロンプト：{p['requests']}件 / 平均 {p['avg_chars']}文字 / 最大 {p['max_chars']}文字 / 直近 {p['last_chars']}文字"
+            )
+            if p["avg_prompt_tokens"] is not None:
+                lines.append(
+                    f"トークン：入力 平均 {p['avg_prompt_tokens']} / 最大 {p['max_prompt_tokens']}・出力 平均 {p['avg_output_tokens']}"
+                )
+            c = talk.cache_stats
+            lines.append(f"キャッシュ：ヒット {c['hits']} / ミス {c['misses']} / 同時質問のまとめ {talk.inflight.coalesced}")
+            q = talk.requests.summary()
+            lines.append(
+                f"待ち行列：{q['depth']}/{q['maxsize']}件（最大 {q['max_depth']}）・処理中 {q['running']}/{q['concurrency']}"
+                f"・待ち時間 p95 {q['wait']['p95_ms'] / 1000:.1f}秒"
+            )
+            lines.append(
+                f"受付 {q['accepted']} / 混雑で拒否 {q['busy']} / 連投で拒否 {q['rate_limited']}"
+                f" / 停止中 {q['disabled'] + q['dropped']} / 失敗 {q['failed']}"
+            )
+
+        await ctx.reply("\n".join(lines), mention_author=False)
 
     @commands.command(name="ai_off")
     @commands.has_permissions(administrator=True)
@@ -12,14 +12,17 @@ class RealtimeRedirect(commands.Cog):
         # .envから設定を読み込む
         self.staff_role_id = int(os.getenv('STAFF_ROLE_ID'))
         self.realtime_channel_id = int(os.getenv('REALTIME_CHANNEL_ID'))
-    
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        # Botのメッセージは無視
-        if message.author.bot:
-            return
-        
-        # メッセージが「同接誘導」のみかチェック
+
+    async def cog_load(self):
+        # メッセージが「同接誘導」のみのときだけ dispatcher から呼ばれる
+        self.route = self.bot.dispatcher.register(
+            self.handle_message, name="realtime-redirect", content='同接誘導', guild_only=True
+        )
+
+    async def cog_unload(self):
+        self.bot.dispatcher.unregister(self.route)
+
+    async def handle_message(self, message):
         if message.content == '同接誘導':
             # スタッフロールを持っているかチェック
             staff_role = discord.utils.get(message.guild.roles, id=self.staff_role_id)
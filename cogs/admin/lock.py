@@ -1,25 +1,87 @@
 import discord
 from discord.ext import commands
-import sqlite3
+import asyncio
+import json
+import time
 
 DB_PATH = "data/pin.db"
 
+STICKY_QUIET_PERIOD = 3.0   # 最後の発言からこの秒数静かになったら再送
+STICKY_MAX_DELAY = 10.0     # 発言が続いていても最初の発言からこの秒数で再送
+STICKY_COOLDOWN = 5.0       # 再送どうしの最短間隔
+
+
+# 元メッセージから再送用の埋め込みを作る
+def build_payload(msg: discord.Message) -> dict:
+    # ---- ここがポイント：常に“埋め込みとして”再送する ----
+    # 元が埋め込みなら1つ目をそのまま使う／なければ本文をdescriptionへ
+    if msg.embeds:
+        embed = msg.embeds[0]
+    else:
+        embed = discord.Embed(
+            description=msg.content or "\u200b",  # 空を避ける
+            color=discord.Color.blue()
+        )
+    return embed.to_dict()
+
+
+class StickyState:
+    """チャンネルごとの再送待ち状態"""
+
+    def __init__(self):
+        self.first_trigger = 0.0
+        self.last_trigger = 0.0
+        self.last_repost = 0.0
+        self.task: asyncio.Task | None = None
+        self.lock = asyncio.Lock()
+
+
 class LockMessage(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self._init_db()
+        self.db = bot.storage.get(DB_PATH)
+        # (guild_id, channel_id) -> {固定対象のmessage_id: 再送用の埋め込み}（固定のないチャンネルはキーなし）
+        self.locked: dict[tuple[int, int], dict[int, dict | None]] = {}
+        self.states: dict[tuple[int, int], StickyState] = {}
 
-    def _init_db(self):
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("""CREATE TABLE IF NOT EXISTS locked_messages (
+    async def cog_load(self):
+        await self.db.executescript("""CREATE TABLE IF NOT EXISTS locked_messages (
             guild_id INTEGER,
             channel_id INTEGER,
             message_id INTEGER,
             PRIMARY KEY (guild_id, channel_id, message_id)
         )""")
-        conn.commit()
-        conn.close()
+
+        # 再送用の埋め込みを保存する列（旧DBには後から追加）
+        columns = [row[1] for row in await self.db.fetchall("PRAGMA table_info(locked_messages)")]
+        if "payload" not in columns:
+            await self.db.execute("ALTER TABLE locked_messages ADD COLUMN payload TEXT")
+
+        rows = await self.db.fetchall("SELECT guild_id, channel_id, message_id, payload FROM locked_messages")
+        for guild_id, channel_id, message_id, payload in rows:
+            self.locked.setdefault((guild_id, channel_id), {})[message_id] = json.loads(payload) if payload else None
+
+        self.route = self.bot.dispatcher.register(self.handle_message, name="lock", channels=(), guild_only=True)
+        self._sync_route()
+
+    async def cog_unload(self):
+        self.bot.dispatcher.unregister(self.route)
+        for state in self.states.values():
+            if state.task:
+                state.task.cancel()
+
+    def _sync_route(self):
+        # 固定のあるチャンネルだけ dispatcher から呼ばれるようにする
+        self.bot.dispatcher.set_channels(self.route, {channel_id for _, channel_id in self.locked})
+
+    def _discard(self, key: tuple[int, int], message_id: int):
+        locked = self.locked.get(key)
+        if locked is None:
+            return
+        locked.pop(message_id, None)
+        if not locked:
+            del self.locked[key]
+            self._sync_route()
 
     @commands.command(name="lock")
     @commands.has_permissions(administrator=True)
@@ -31,12 +93,13 @@ class LockMessage(commands.Cog):
             await ctx.send("❌ メッセージが見つかりません。", ephemeral=True)
             return
 
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("INSERT OR IGNORE INTO locked_messages (guild_id, channel_id, message_id) VALUES (?, ?, ?)",
-                  (ctx.guild.id, ctx.channel.id, target_msg.id))
-        conn.commit()
-        conn.close()
+        payload = build_payload(target_msg)
+        await self.db.execute(
+            "INSERT OR IGNORE INTO locked_messages (guild_id, channel_id, message_id, payload) VALUES (?, ?, ?, ?)",
+            (ctx.guild.id, ctx.channel.id, target_msg.id, json.dumps(payload, ensure_ascii=False))
+        )
+        self.locked.setdefault((ctx.guild.id, ctx.channel.id), {})[target_msg.id] = payload
+        self._sync_route()
 
         await ctx.send(f"✅ メッセージ `{message_id}` を {ctx.channel.mention} で固定対象にしました。", ephemeral=True)
 
@@ -44,97 +107,108 @@ class LockMessage(commands.Cog):
     @commands.has_permissions(administrator=True)
     async def unlock(self, ctx, message_id: int):
         """固定対象から解除"""
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("DELETE FROM locked_messages WHERE guild_id = ? AND channel_id = ? AND message_id = ?",
-                  (ctx.guild.id, ctx.channel.id, message_id))
-        conn.commit()
-        conn.close()
+        await self.db.execute(
+            "DELETE FROM locked_messages WHERE guild_id = ? AND channel_id = ? AND message_id = ?",
+            (ctx.guild.id, ctx.channel.id, message_id)
+        )
+        self._discard((ctx.guild.id, ctx.channel.id), message_id)
 
         await ctx.send(f"✅ メッセージ `{message_id}` の固定を解除しました。", ephemeral=True)
 
     @commands.command(name="listlocks")
     async def listlocks(self, ctx):
         """現在の固定対象を表示"""
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("SELECT message_id FROM locked_messages WHERE guild_id = ? AND channel_id = ?",
-                  (ctx.guild.id, ctx.channel.id))
-        rows = c.fetchall()
-        conn.close()
-
-        if not rows:
+        locked = self.locked.get((ctx.guild.id, ctx.channel.id))
+
+        if not locked:
             await ctx.send("📌 このチャンネルには固定対象はありません。", ephemeral=True)
             return
 
-        ids = [str(r[0]) for r in rows]
+        ids = [str(i) for i in sorted(locked)]
         await ctx.send("📌 現在の固定対象メッセージID:\n" + "\n".join(ids), ephemeral=True)
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-     # BotやDMは無視
-     if message.author.bot or not message.guild:
+    async def handle_message(self, message: discord.Message):
+     # BotやDMは dispatcher 側で除外済み
+     # このギルド・チャンネルで固定対象があるかを取得（メモリ上の索引のみ）
+     key = (message.guild.id, message.channel.id)
+     if key not in self.locked:
         return
 
-     # このギルド・チャンネルで固定対象があるかを取得
-     conn = sqlite3.connect(DB_PATH)
-     c = conn.cursor()
-     c.execute(
-        "SELECT message_id FROM locked_messages WHERE guild_id = ? AND channel_id = ?",
-        (message.guild.id, message.channel.id),
-     )
-     rows = c.fetchall()
-     conn.close()
-
-     if not rows:
-        return
+     # 再送は待ち合わせてまとめる（連続した発言では1回だけ）
+     now = time.monotonic()
+     state = self.states.setdefault(key, StickyState())
+     state.last_trigger = now
+     if state.task is None:
+        state.first_trigger = now
+        state.task = asyncio.create_task(self._debounced_repost(message.channel, key, state))
 
-     for (msg_id,) in rows:
+    async def _debounced_repost(self, channel, key, state: StickyState):
         try:
-            # 直前の「固定コピー」を取得
-            old_msg = await message.channel.fetch_message(msg_id)
-
-            # ---- ここがポイント：常に“埋め込みとして”再送する ----
-            # 元が埋め込みなら1つ目をそのまま使う／なければ本文をdescriptionへ
-            if old_msg.embeds:
-                embed = old_msg.embeds[0]
-            else:
-                embed = discord.Embed(
-                    description=old_msg.content or "\u200b",  # 空を避ける
-                    color=discord.Color.blue()
+            while True:
+                due = max(
+                    min(state.last_trigger + STICKY_QUIET_PERIOD, state.first_trigger + STICKY_MAX_DELAY),
+                    state.last_repost + STICKY_COOLDOWN
                 )
-
-            # 新しい埋め込みメッセージを最下部に送信（content/添付は送らない）
-            new_msg = await message.channel.send(embed=embed)
-
-            # DBのmessage_idを更新（= 次回はこの新しい固定コピーを対象にする）
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute(
-                "UPDATE locked_messages SET message_id = ? WHERE guild_id = ? AND channel_id = ? AND message_id = ?",
-                (new_msg.id, message.guild.id, message.channel.id, msg_id),
+                wait = due - time.monotonic()
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+        finally:
+            # ここ以降の発言は次の再送として扱う
+            state.task = None
+
+        async with state.lock:
+            await self.repost(channel, key)
+            state.last_repost = time.monotonic()
+
+    async def repost(self, channel, key):
+        for msg_id, payload in list(self.locked.get(key, {}).items()):
+            try:
+                # 旧DBの行だけは一度取得して埋め込みを覚える
+                if payload is None:
+                    payload = build_payload(await channel.fetch_message(msg_id))
+
+                # 新しい埋め込みメッセージを最下部に送信（content/添付は送らない）
+                new_msg = await channel.send(embed=discord.Embed.from_dict(payload))
+
+            except discord.NotFound:
+                # 直前の固定コピーが見つからない場合はDBから掃除
+                await self.db.execute(
+                    "DELETE FROM locked_messages WHERE guild_id = ? AND channel_id = ? AND message_id = ?",
+                    (key[0], key[1], msg_id),
+                )
+                self._discard(key, msg_id)
+                continue
+
+            except discord.HTTPException as e:
+                print("❌ 固定メッセージの再送失敗:", e)
+                continue
+
+            # 送信中に unlock された場合は新しいコピーを消して終わり
+            if msg_id not in self.locked.get(key, {}):
+                try:
+                    await new_msg.delete()
+                except discord.HTTPException:
+                    pass
+                continue
+
+            # message_idを更新（= 次回はこの新しい固定コピーを対象にする）
+            locked = self.locked[key]
+            del locked[msg_id]
+            locked[new_msg.id] = payload
+            await self.db.execute(
+                "UPDATE locked_messages SET message_id = ?, payload = ? "
+                "WHERE guild_id = ? AND channel_id = ? AND message_id = ?",
+                (new_msg.id, json.dumps(payload, ensure_ascii=False), key[0], key[1], msg_id),
             )
-            conn.commit()
-            conn.close()
 
-            # 直前の固定コピーだけ削除（他の通常メッセージは削除しない）
+            # 直前の固定コピーだけ削除（取得はせずIDだけで削除する）
             try:
-                await old_msg.delete()
+                await channel.get_partial_message(msg_id).delete()
             except discord.HTTPException:
                 pass
 
-        except discord.NotFound:
-            # 直前の固定コピーが見つからない場合はDBから掃除
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute(
-                "DELETE FROM locked_messages WHERE guild_id = ? AND channel_id = ? AND message_id = ?",
-                (message.guild.id, message.channel.id, msg_id),
-            )
-            conn.commit()
-            conn.close()
-
 
 
 async def setup(bot):
-    await bot.add_cog(LockMessage(bot))
\ No newline at end of file
+    await bot.add_cog(LockMessage(bot))
@@ -1,46 +1,11 @@
 import discord
 from discord.ext import commands
-import json
-import os
 from datetime import datetime
 
-DATA_FILE = "data/omikuji/omikuji.json"
-CONTROL_FILE = "data/omikuji/omikuji_control.json"
+from utils.omikuji_data import RESULTS, get_omikuji_control, get_omikuji_store
 
-RESULTS = ["ござ吉", "大吉", "中吉", "小吉", "吉", "末吉", "凶", "大凶", "大厄日"]
 MAX_PRESETS = 5
 
-# =====================
-# JSON
-# =====================
-def load_data():
-    if not os.path.exists(DATA_FILE):
-        return {}
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_data(data):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
-
-def load_control():
-    if not os.path.exists(CONTROL_FILE):
-        return {
-            "tester": [],
-            "probability": {
-                "mode": "normal",   # normal / custom / preset
-                "weights": {r: 1 for r in RESULTS},
-                "presets": {},
-                "active_preset": None
-            }
-        }
-    with open(CONTROL_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_control(data):
-    with open(CONTROL_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
-
 # =====================
 # 表示用
 # =====================
@@ -61,7 +26,8 @@ class TesterModal(discord.ui.Modal, title="テスターモード切替"):
     user_id = discord.ui.TextInput(label="ユーザーID")
 
     async def on_submit(self, interaction: discord.Interaction):
-        control = load_control()
+        omikuji_control = get_omikuji_control(interaction.client)
+        control = omikuji_control.snapshot()
         uid = self.user_id.value.strip()
 
         if uid in control["tester"]:
@@ -71,7 +37,7 @@ class TesterModal(discord.ui.Modal, title="テスターモード切替"):
             control["tester"].append(uid)
             msg = "✅ テスターモードに設定しました。"
 
-        save_control(control)
+        await omikuji_control.save(control)
         await interaction.response.send_message(msg, ephemeral=True)
 
 class StreakModal(discord.ui.Modal, title="連続日数変更"):
@@ -79,15 +45,14 @@ class StreakModal(discord.ui.Modal, title="連続日数変更"):
     days = discord.ui.TextInput(label="連続日数", placeholder="数字")
 
     async def on_submit(self, interaction: discord.Interaction):
-        data = load_data()
+        store = get_omikuji_store(interaction.client)
         uid = self.user_id.value.strip()
         count = int(self.days.value)
 
-        if uid not in data:
-            data[uid] = {"last_date": datetime.now().strftime("%Y-%m-%d"), "count": 0}
-
-        data[uid]["count"] = count
-        save_data(data)
+        async with store.lock(uid):
+            record = store.get(uid)
+            last_date = record["last_date"] if record else datetime.now().strftime("%Y-%m-%d")
+            await store.put(uid, last_date, count)
 
         await interaction.response.send_message("✅ 連続日数を変更しました。", ephemeral=True)
 
@@ -95,13 +60,12 @@ class UserInfoModal(discord.ui.Modal, title="ユーザー情報検索"):
     user_id = discord.ui.TextInput(label="ユーザーID")
 
     async def on_submit(self, interaction: discord.Interaction):
-        data = load_data()
         uid = self.user_id.value.strip()
+        info = get_omikuji_store(interaction.client).get(uid)
 
-        if uid not in data:
+        if info is None:
             return await interaction.response.send_message("記録がありません。", ephemeral=True)
 
-        info = data[uid]
         today = datetime.now().strftime("%Y-%m-%d")
 
         embed = discord.Embed(title="👤 ユーザー情報", color=discord.Color.green())
@@ -128,11 +92,12 @@ class ProbabilityModal(discord.ui.Modal, title="確率変更"):
             except:
                 pass
 
-        control = load_control()
+        omikuji_control = get_omikuji_control(interaction.client)
+        control = omikuji_control.snapshot()
         control["probability"]["weights"] = weights
         control["probability"]["mode"] = "custom"
         control["probability"]["active_preset"] = None
-        save_control(control)
+        await omikuji_control.save(control)
 
         view = SavePresetView()
         await interaction.response.send_message(
@@ -145,7 +110,8 @@ class PresetNameModal(discord.ui.Modal, title="プリセット名変更"):
     name = discord.ui.TextInput(label="プリセット名")
 
     async def on_submit(self, interaction: discord.Interaction):
-        control = load_control()
+        omikuji_control = get_omikuji_control(interaction.client)
+        control = omikuji_control.snapshot()
         presets = control["probability"]["presets"]
 
         if len(presets) >= MAX_PRESETS:
@@ -155,7 +121,7 @@ class PresetNameModal(discord.ui.Modal, title="プリセット名変更"):
         control["probability"]["mode"] = "preset"
         control["probability"]["active_preset"] = self.name.value
 
-        save_control(control)
+        await omikuji_control.save(control)
         await interaction.response.send_message("✅ プリセットを保存しました。", ephemeral=True)
 
 # =====================
@@ -174,8 +140,7 @@ class SavePresetView(discord.ui.View):
         await interaction.response.send_message("❌ 登録しませんでした。", ephemeral=True)
 
 class PresetSelect(discord.ui.Select):
-    def __init__(self):
-        control = load_control()
+    def __init__(self, control: dict):
         options = [discord.SelectOption(label="通常", value="normal")]
 
         for name in control["probability"]["presets"]:
@@ -188,7 +153,8 @@ class PresetSelect(discord.ui.Select):
         )
 
     async def callback(self, interaction: discord.Interaction):
-        control = load_control()
+        omikuji_control = get_omikuji_control(interaction.client)
+        control = omikuji_control.snapshot()
         val = self.values[0]
 
         if val == "normal":
@@ -198,13 +164,13 @@ class PresetSelect(discord.ui.Select):
             control["probability"]["weights"] = control["probability"]["presets"][val]
             control["probability"]["active_preset"] = val
 
-        save_control(control)
+        await omikuji_control.save(control)
         await interaction.response.send_message("✅ プリセットを適用しました。", ephemeral=True)
 
 class OmikujiControlView(discord.ui.View):
-    def __init__(self):
+    def __init__(self, control: dict):
         super().__init__(timeout=None)
-        self.add_item(PresetSelect())
+        self.add_item(PresetSelect(control))
 
     @discord.ui.button(label="テスターモード切替", style=discord.ButtonStyle.green, custom_id="omikuji:tester")
     async def tester(self, i, _): await i.response.send_modal(TesterModal())
@@ -221,9 +187,8 @@ class OmikujiControlView(discord.ui.View):
 
     @discord.ui.button(label="今日引いた人数", style=discord.ButtonStyle.secondary, custom_id="omikuji:today")
     async def today(self, interaction: discord.Interaction, _):
-        data = load_data()
         today = datetime.now().strftime("%Y-%m-%d")
-        users = [f"<@{u}>" for u, v in data.items() if v["last_date"] == today]
+        users = [f"<@{u}>" for u in get_omikuji_store(interaction.client).drawn_on(today)]
         await interaction.response.send_message(
             "\n".join(users) if users else "誰も引いていません。",
             ephemeral=True
@@ -231,7 +196,7 @@ class OmikujiControlView(discord.ui.View):
 
     @discord.ui.button(label="確率確認", style=discord.ButtonStyle.secondary, custom_id="omikuji:check")
     async def check(self, interaction: discord.Interaction, _):
-        control = load_control()
+        control = get_omikuji_control(interaction.client).data
         await interaction.response.send_message(
             format_probability(control["probability"]["weights"]),
             ephemeral=True
@@ -246,6 +211,9 @@ class OmikujiControlView(discord.ui.View):
 class OmikujiControlCog(commands.Cog):
     def __init__(self, bot): self.bot = bot
 
+    async def cog_load(self):
+        await get_omikuji_store(self.bot).load()
+
     @commands.command(name="omikuji_ctrl")
     @commands.is_owner()
     async def ctrl(self, ctx):
@@ -254,8 +222,8 @@ class OmikujiControlCog(commands.Cog):
             description="おみくじの管理パネル",
             color=discord.Color.green()
         )
-        await ctx.send(embed=embed, view=OmikujiControlView())
+        await ctx.send(embed=embed, view=OmikujiControlView(get_omikuji_control(self.bot).data))
 
 async def setup(bot):
-    bot.add_view(OmikujiControlView())
+    bot.add_view(OmikujiControlView(get_omikuji_control(bot).data))
     await bot.add_cog(OmikujiControlCog(bot))
@@ -0,0 +1,83 @@
+from discord.ext import commands
+
+from utils.perf import DUMP_PATH
+
+PERF_TOP = 15  # P!perf で表示する件数
+
+
+def format_stats(name: str, s: dict) -> str:
+    return (
+        f"{name:<40} {s['calls']:>7}回 p50 {s['p50_ms']:>7.1f} p95 {s['p95_ms']:>7.1f} "
+        f"p99 {s['p99_ms']:>7.1f} 最大 {s['max_ms']:>7.1f}ms エラー{s['errors']}"
+    )
+
+
+class PerfCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name="dispatch_stats")
+    @commands.is_owner()
+    async def dispatch_stats(self, ctx):
+        """on_message ハンドラごとの実行時間"""
+        routes = sorted(self.bot.dispatcher.routes, key=lambda r: r.stats.total, reverse=True)
+        if not routes:
+            return await ctx.send("登録されたハンドラはありません。")
+
+        lines = [format_stats(r.name, r.stats.summary()) for r in routes]
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    @commands.command(name="perf")
+    @commands.is_owner()
+    async def perf(self, ctx, top: int = PERF_TOP):
+        """リスナー・コマンドの実行時間（p95の遅い順）とイベントループ遅延"""
+        report = self.bot.instrumentation.report()
+        handlers = sorted(report["handlers"].items(), key=lambda item: item[1]["p95_ms"], reverse=True)
+        handlers = [(name, s) for name, s in handlers if s["calls"]][:max(top, 1)]
+
+        lag = report["loop_lag"]
+        lines = [
+            f"イベントループ遅延: p50 {lag['p50_ms']:.1f} / p95 {lag['p95_ms']:.1f} / "
+            f"p99 {lag['p99_ms']:.1f} / 最大 {lag['max_ms']:.1f}ms",
+            f"Gateway: {report['gateway_latency_ms']}ms",
+        ]
+        if self.bot.webhooks:
+            m = self.bot.webhooks.metrics
+            lines.append(f"Webhook: 送信 {m['sent']} / まとめ {m['merged']} / 再試行 {m['retries']} / 失敗 {m['failed']}")
+        lines.append("")
+        lines += [format_stats(name, s) for name, s in handlers] or ["まだ記録がありません。"]
+
+        text = "\n".join(lines)
+        if len(text) > 1900:
+            text = text[:1900] + "\n…"
+        await ctx.send("```\n" + text + "\n```")
+
+    @commands.command(name="blocking")
+    @commands.is_owner()
+    async def blocking(self, ctx, top: int = 5):
+        """イベントループを止めた呼び出し箇所（合計時間の長い順）"""
+        watchdog = self.bot.instrumentation.watchdog
+        if watchdog is None:
+            return await ctx.send("停止検出は無効です（LOOP_WATCHDOG=1 で有効化）。")
+
+        report = watchdog.report()
+        lines = [f"{report['threshold_ms']:.0f}ms 以上の停止: {report['stalls']}回", ""]
+        for key, site in list(report["sites"].items())[:max(top, 1)]:
+            lines.append(f"{key}  {site['count']}回 合計 {site['total_ms']:.0f}ms 最大 {site['max_ms']:.0f}ms")
+            lines += [f"    {frame}" for frame in site["stack"][-3:]]
+
+        text = "\n".join(lines)
+        if len(text) > 1900:
+            text = text[:1900] + "\n…"
+        await ctx.send("```\n" + text + "\n```")
+
+    @commands.command(name="perf_dump")
+    @commands.is_owner()
+    async def perf_dump(self, ctx):
+        """計測結果を今すぐファイルへ書き出す"""
+        await self.bot.instrumentation.dump()
+        await ctx.send(f"✅ {DUMP_PATH} に書き出しました。")
+
+
+async def setup(bot):
+    await bot.add_cog(PerfCog(bot))
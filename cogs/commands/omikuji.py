@@ -1,68 +1,118 @@
 import discord
 from discord.ext import commands
 import random
-import json
-import os
+import asyncio
+import time
 from datetime import datetime, timedelta
-import sqlite3
-
-DATA_FILE = "data/omikuji/omikuji.json"
-STATS_DB_PATH = "data/omikuji/omikuji_stats.db"  # ★統計用DB
-CONTROL_FILE = "data/omikuji/omikuji_control.json"  # ★テスターモード管理用
-
-def load_data():
-    if not os.path.exists(DATA_FILE):
-        return {}
-    with open(DATA_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_data(data):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
-
-def load_control():
-    if not os.path.exists(CONTROL_FILE):
-        return {
-            "tester": [],
-            "probability": {
-                "mode": "normal",
-                "weights": {}
-            }
-        }
-
-    with open(CONTROL_FILE, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    data.setdefault("tester", [])
-    data.setdefault("probability", {"mode": "normal", "weights": {}})
-
-    return data
-
 
-def save_control(data):
-    with open(CONTROL_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
-
-def get_omikuji_result(results):
-    control = load_control()
-    prob = control.get("probability", {})
+from utils.omikuji_data import RESULTS, get_omikuji_control, get_omikuji_stats, get_omikuji_store
+
+FRAME_INTERVAL = 1.5        # 1行ごとの表示間隔（秒）
+CHANNEL_EDIT_LIMIT = 5      # チャンネルごとの編集回数の目安（CHANNEL_EDIT_WINDOW 秒あたり）
+CHANNEL_EDIT_WINDOW = 5.0
+
+# =====================
+# チャンネル単位の編集枠
+# =====================
+class ChannelBucket:
+    """トークンバケット（CHANNEL_EDIT_WINDOW 秒に CHANNEL_EDIT_LIMIT 回まで）"""
+
+    def __init__(self):
+        self.tokens = float(CHANNEL_EDIT_LIMIT)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        rate = CHANNEL_EDIT_LIMIT / CHANNEL_EDIT_WINDOW
+        self.tokens = min(CHANNEL_EDIT_LIMIT, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    async def acquire(self):
+        while not self.try_acquire():
+            await asyncio.sleep((1 - self.tokens) * CHANNEL_EDIT_WINDOW / CHANNEL_EDIT_LIMIT)
+
+# =====================
+# おみくじ演出スケジューラ
+# =====================
+class OmikujiAnimator:
+    """進行中の演出をまとめて管理し、混雑時は途中の行を飛ばして編集回数を抑える"""
+
+    def __init__(self):
+        self.buckets: dict[int, ChannelBucket] = {}
+        self.tasks: set[asyncio.Task] = set()
+        self.metrics = {
+            "reveals": 0,           # 開始した演出数
+            "frames_sent": 0,       # 実際に送信・編集したフレーム数
+            "frames_coalesced": 0,  # 混雑のため次のフレームにまとめた数
+            "frames_dropped": 0,    # エラーで表示できなかったフレーム数
+        }
 
-    # 通常モード → 完全ランダム（今まで通り）
-    if prob.get("mode", "normal") == "normal":
-        return random.choice(results)
+    @staticmethod
+    def render(lines: list[str], shown: int) -> str:
+        return "".join(line + "\n" for line in lines[:shown])
+
+    def start(self, msg: discord.Message, embed: discord.Embed, lines: list[str], celebrate_at=None):
+        """1行目は送信済みの msg に対して、残りの行を順に表示していく"""
+        self.metrics["reveals"] += 1
+        self.metrics["frames_sent"] += 1
+        # 最初の送信もチャンネルの枠を使う
+        self.buckets.setdefault(msg.channel.id, ChannelBucket()).try_acquire()
+        task = asyncio.create_task(self._run(msg, embed, lines, celebrate_at))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run(self, msg, embed, lines, celebrate_at):
+        bucket = self.buckets.setdefault(msg.channel.id, ChannelBucket())
+        last = len(lines) - 1
+
+        for i in range(1, len(lines)):
+            await asyncio.sleep(FRAME_INTERVAL)
+
+            # 途中の行は枠が空いていなければ飛ばす（最後の行は必ず表示）
+            if i < last:
+                if not bucket.try_acquire():
+                    self.metrics["frames_coalesced"] += 1
+                    continue
+            else:
+                await bucket.acquire()
+
+            embed.description = self.render(lines, i + 1)
+            try:
+                await msg.edit(embed=embed)
+            except discord.HTTPException:
+                self.metrics["frames_dropped"] += last - i + 1
+                return
+            self.metrics["frames_sent"] += 1
 
-    # カスタムモード
-    weights = prob.get("weights", {})
-    weight_list = [weights.get(r, 1) for r in results]
+            # ★ 結果が表示された瞬間にリアクション
+            if celebrate_at is not None and i >= celebrate_at:
+                celebrate_at = None
+                try:
+                    await msg.add_reaction("🎉")
+                except discord.HTTPException:
+                    pass
 
-    return random.choices(results, weights=weight_list, k=1)[0]
+    def close(self):
+        for task in self.tasks:
+            task.cancel()
 
 class OmikujiCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.stats = get_omikuji_stats(bot)  # ★統計用DB
+        self.store = get_omikuji_store(bot)
+        self.control = get_omikuji_control(bot)
+        self.animator = OmikujiAnimator()
 
         # おみくじ結果
-        self.results = ["ござ吉", "大吉", "中吉", "小吉", "吉", "末吉", "凶", "大凶", "大厄日"]
+        self.results = RESULTS
 
         # 結果ごとのコメント
         self.iroha_messages = {
@@ -114,66 +164,49 @@ class OmikujiCog(commands.Cog):
             ]
         }
 
-    def save_stats(self, result):
-        with sqlite3.connect(STATS_DB_PATH) as conn:
-            conn.execute("INSERT INTO stats (result) VALUES (?)", 
-                         (result,)
-                         )
-            
+    async def cog_load(self):
+        await self.store.load()
+        await self.stats.load()
+
+    async def cog_unload(self):
+        self.animator.close()
+
+    async def save_stats(self, result):
+        await self.stats.record(result)
+
     @commands.hybrid_command(name="おみくじ", description="風真いろはのコメント付きおみくじ！")
     async def omikuji(self, ctx):
         user_id = str(ctx.author.id)
         today = datetime.now().date()
 
-        data = load_data()
-        control = load_control()
-
-        is_tester = user_id in control.get("tester", [])
+        is_tester = self.control.is_tester(user_id)
 
-        # ★ テスターモードは回数無限 → 日付制限スキップ
-        if not is_tester:
-            if user_id in data:
-                last_date = datetime.strptime(data[user_id]["last_date"], "%Y-%m-%d").date()
+        # ★ 同じ人の同時実行で二重に引けないようユーザー単位でロック
+        async with self.store.lock(user_id):
+            record = self.store.get(user_id)
+            count = 1
 
-                if last_date == today:
-                    return await ctx.reply("もう既に引いています。明日チャレンジしてね！")
-
-                if last_date == today - timedelta(days=1):
-                    data[user_id]["count"] += 1
+            if record:
+                # ★ テスターモードは回数無限 → 日付制限スキップ
+                if is_tester:
+                    count = record["count"]
                 else:
-                    del data[user_id]
+                    last_date = datetime.strptime(record["last_date"], "%Y-%m-%d").date()
 
-        if user_id not in data:
-            data[user_id] = {"last_date": today.strftime("%Y-%m-%d"), "count": 1}
+                    if last_date == today:
+                        return await ctx.reply("もう既に引いています。明日チャレンジしてね！")
 
-        data[user_id]["last_date"] = today.strftime("%Y-%m-%d")
-        streak = data[user_id]["count"]
+                    if last_date == today - timedelta(days=1):
+                        count = record["count"] + 1
 
-        save_data(data)
+            await self.store.put(user_id, today.strftime("%Y-%m-%d"), count)
+            streak = count
 
-        result = get_omikuji_result(self.results)
-        self.save_stats(result)
+        result = self.control.draw()
+        await self.save_stats(result)
         iroha_msg = random.choice(self.iroha_messages[result])
         color = discord.Color.random()
 
-        # ---- ★ メンションだけ先に送信 ----
-        msg = await ctx.send(f"{ctx.author.mention}")
-
-        # ---- ★ 埋め込み準備 ----
-        embed = discord.Embed(
-            title="🍃ござるおみくじ結果🍃",
-            description="",
-            color=color
-        )
-
-        # フッター（連続参拝日数入り）
-        embed.set_footer(
-            text=f"また明日もお参りください！│連続参拝 : {streak}日\n©2026 かざま隊の集いの場"
-        )
-
-        # 空の状態で送信
-        await msg.edit(content=ctx.author.mention, embed=embed)
-
         # ---- ★ 1行ずつ表示する文章 ----
         texts = [
             "みこちがいるさくら神社に到着した...\n",
@@ -186,17 +219,34 @@ class OmikujiCog(commands.Cog):
             f"**風真いろはからのメッセージ**：\n{iroha_msg}"
         ]
 
-        current_desc = ""
+        # ---- ★ 埋め込み準備（1行目を入れた状態で最初から送信） ----
+        embed = discord.Embed(
+            title="🍃ござるおみくじ結果🍃",
+            description=OmikujiAnimator.render(texts, 1),
+            color=color
+        )
+
+        # フッター（連続参拝日数入り）
+        embed.set_footer(
+            text=f"また明日もお参りください！│連続参拝 : {streak}日\n©2026 かざま隊の集いの場"
+        )
 
-        # ---- ★ 1行ずつ1秒おきに編集 ----
-        for line in texts:
-            current_desc += line + "\n"
-            embed.description = current_desc
-            await msg.edit(content=ctx.author.mention, embed=embed)
-            # ★ 結果が表示された瞬間にリアクション
-            if f"**{result}**" in line and result in ["ござ吉", "大吉"]:
-                await msg.add_reaction("🎉")
-            await discord.utils.sleep_until(datetime.now() + timedelta(seconds=1.5))
+        msg = await ctx.send(content=ctx.author.mention, embed=embed)
+
+        # ---- ★ 残りの行はスケジューラが表示 ----
+        celebrate_at = 6 if result in ["ござ吉", "大吉"] else None
+        self.animator.start(msg, embed, texts, celebrate_at)
+
+    @commands.command(name="omikuji_anim")
+    @commands.is_owner()
+    async def omikuji_anim(self, ctx):
+        """おみくじ演出の統計"""
+        m = self.animator.metrics
+        await ctx.send(
+            f"🎞 進行中: {len(self.animator.tasks)}件 / 開始: {m['reveals']}件\n"
+            f"送信フレーム: {m['frames_sent']} / まとめたフレーム: {m['frames_coalesced']}"
+            f" / 表示失敗: {m['frames_dropped']}"
+        )
 
 
 async def setup(bot):
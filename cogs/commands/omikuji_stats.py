@@ -1,15 +1,19 @@
 import discord
 from discord.ext import commands
-import sqlite3
 import os
-import matplotlib.pyplot as plt
+import io
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Literal
 from matplotlib import font_manager, rcParams
+from matplotlib.figure import Figure
+from matplotlib.ticker import MaxNLocator
 
-# =====================
-# パス設定
-# =====================
-DB_PATH = "data/omikuji/omikuji_stats.db"
-IMG_PATH = "data/omikuji/images/omikuji_stats.png"
+from utils.cache import LRUCache
+from utils.omikuji_data import RESULTS, get_omikuji_stats
+
+GRAPH_CACHE_SIZE = 16
 
 # =====================
 # 日本語フォント（存在チェック付き）
@@ -28,44 +32,26 @@ for path in FONT_CANDIDATES:
 rcParams["axes.unicode_minus"] = False
 
 # =====================
-# 結果一覧
-# =====================
-RESULTS = ["ござ吉", "大吉", "中吉", "小吉", "吉", "末吉", "凶", "大凶", "大厄日"]
-
-# =====================
-# DB初期化
+# 集計期間
 # =====================
-def init_db():
-    os.makedirs("data/omikuji/images", exist_ok=True)
-
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("""
-        CREATE TABLE IF NOT EXISTS stats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            result TEXT NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
+PERIOD_DESCRIPTIONS = {
+    "累計": "これまでに引かれた結果の回数です。",
+    "今週": "今週（月曜日から）引かれた結果の回数です。",
+    "今日": "今日引かれた結果の回数です。",
+}
 
-# =====================
-# データ取得
-# =====================
-def fetch_stats():
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.cursor()
-        cur.execute("""
-        SELECT result, COUNT(*) 
-        FROM stats 
-        GROUP BY result
-        """)
-        return cur.fetchall()
+def period_since(period: str):
+    today = date.today()
+    if period == "今日":
+        return today.strftime("%Y-%m-%d")
+    if period == "今週":
+        return (today - timedelta(days=today.weekday())).strftime("%Y-%m-%d")
+    return None
 
 # =====================
 # グラフ生成
 # =====================
-def generate_graph():
-    rows = fetch_stats()
-
+def generate_graph(rows) -> bytes:
     # 全結果を0で初期化
     counts = {r: 0 for r in RESULTS}
 
@@ -77,18 +63,21 @@ def generate_graph():
     labels = list(counts.keys())
     values = list(counts.values())
 
-    plt.figure(figsize=(10, 5))
-    plt.bar(labels, values)
-    plt.title("おみくじ結果 統計")
-    plt.xlabel("結果")
-    plt.ylabel("回数")
+    # pyplot を使わず Figure を直接作る（スレッドから安全に描ける）
+    fig = Figure(figsize=(10, 5))
+    ax = fig.add_subplot()
+    ax.bar(labels, values)
+    ax.set_title("おみくじ結果 統計")
+    ax.set_xlabel("結果")
+    ax.set_ylabel("回数")
 
-    max_count = max(values) if values else 0
-    plt.yticks(range(0, max_count + 1, 1))
+    # 目盛りは整数で10本程度に抑える（件数が増えても描画時間は一定）
+    ax.yaxis.set_major_locator(MaxNLocator(nbins=10, integer=True))
 
-    plt.tight_layout()
-    plt.savefig(IMG_PATH)
-    plt.close()
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
 
 # =====================
 # Cog
@@ -96,24 +85,46 @@ def generate_graph():
 class OmikujiStatsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        init_db()
+        self.stats = get_omikuji_stats(bot)
+        self.graphs = LRUCache(GRAPH_CACHE_SIZE)
+        # matplotlib の描画は専用スレッド1本で行う
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="omikuji-graph")
+
+    async def cog_load(self):
+        await self.stats.load()
+
+    async def cog_unload(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def render_graph(self, since, version: int, rows) -> bytes:
+        # 集計が変わっていなければ前回の画像を使う（version は rows を読む前の値）
+        key = (since, version)
+        png = self.graphs.get(key)
+        if png is None:
+            loop = asyncio.get_running_loop()
+            png = await loop.run_in_executor(self._executor, generate_graph, rows)
+            self.graphs.put(key, png)
+        return png
 
     @commands.hybrid_command(
         name="おみくじ統計",
         description="おみくじの統計をグラフで表示します"
     )
-    async def omikuji_stats(self, ctx: commands.Context):
-        rows = fetch_stats()
+    async def omikuji_stats(self, ctx: commands.Context, 期間: Literal["累計", "今週", "今日"] = "累計"):
+        since = period_since(期間)
+        # 読み込み中に引かれた分で古い集計が新しい version に入らないよう、先に控えておく
+        version = self.stats.version
+        rows = await self.stats.fetch(since)
 
         if not rows:
             return await ctx.reply("📊 まだ統計データがありません。")
 
-        generate_graph()
+        png = await self.render_graph(since, version, rows)
 
-        file = discord.File(IMG_PATH, filename="omikuji_stats.png")
+        file = discord.File(io.BytesIO(png), filename="omikuji_stats.png")
         embed = discord.Embed(
             title="📊 おみくじ統計",
-            description="これまでに引かれた結果の回数です。",
+            description=PERIOD_DESCRIPTIONS[期間],
             color=discord.Color.green()
         )
         embed.set_image(url="attachment://omikuji_stats.png")
@@ -1,40 +1,146 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
-from PIL import Image, ImageDraw, ImageFont
-import os
-import sqlite3
-import io
+import asyncio
+from datetime import date, timedelta
+from typing import Literal
+
+from utils.rank_card import RankCardRenderer
+from utils.rank_index import RankIndex
 
 DB_PATH = "data/userdata.db"
+FLUSH_INTERVAL = 10     # 秒ごとにまとめて書き込む
+FLUSH_THRESHOLD = 500   # 溜まった発言数がこれを超えたら即書き込む
+LEADERBOARD_PER_PAGE = 10
+DAILY_RETENTION_DAYS = 62  # これより古い日別データは月別にまとめる
+ACTIVITY_DAYS = 7          # /activity で表示する日数
+ACTIVITY_MONTHS = 6        # /activity で月別合計を表示する月数
+
+# 日付 → 20260118 のような整数キー
+def day_key(d: date) -> int:
+    return d.year * 10000 + d.month * 100 + d.day
+
+# n か月前の月 → 202601 のような整数キー
+def month_key(d: date, months_ago: int = 0) -> int:
+    year, month = divmod(d.year * 12 + d.month - 1 - months_ago, 12)
+    return year * 100 + month + 1
 
 # SQLite 初期化
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    messages INTEGER DEFAULT 0
-                )""")
-    conn.commit()
-    conn.close()
-
-def add_message(user_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor() 
-    c.execute("INSERT OR IGNORE INTO users (user_id, messages) VALUES (?, 0)", (user_id,))
-    c.execute("UPDATE users SET messages = messages + 1 WHERE user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
-    
-def get_user(user_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT messages FROM users WHERE user_id = ?", (user_id,))
-    row = c.fetchone()
-    conn.close()
+async def init_db(db):
+    await db.executescript("""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        messages INTEGER DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS activity_daily (
+        day INTEGER,
+        user_id INTEGER,
+        messages INTEGER NOT NULL,
+        PRIMARY KEY (day, user_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_activity_daily_user ON activity_daily (user_id, day);
+    CREATE TABLE IF NOT EXISTS activity_monthly (
+        month INTEGER,
+        user_id INTEGER,
+        messages INTEGER NOT NULL,
+        PRIMARY KEY (month, user_id)
+    ) WITHOUT ROWID;
+    """)
+
+def _write_counts(conn, counts: dict[int, int], daily: dict[tuple[int, int], int]):
+    conn.executemany(
+        "INSERT INTO users (user_id, messages) VALUES (?, ?) "
+        "ON CONFLICT(user_id) DO UPDATE SET messages = messages + excluded.messages",
+        counts.items()
+    )
+    conn.executemany(
+        "INSERT INTO activity_daily (day, user_id, messages) VALUES (?, ?, ?) "
+        "ON CONFLICT(day, user_id) DO UPDATE SET messages = messages + excluded.messages",
+        [(day, user_id, count) for (day, user_id), count in daily.items()]
+    )
+
+def _compact_daily(conn, before: int) -> int:
+    # before より前の日別データを月別に足し込んでから削除する
+    conn.execute(
+        "INSERT INTO activity_monthly (month, user_id, messages) "
+        "SELECT day / 100, user_id, SUM(messages) FROM activity_daily WHERE day < ? "
+        "GROUP BY day / 100, user_id "
+        "ON CONFLICT(month, user_id) DO UPDATE SET messages = messages + excluded.messages",
+        (before,)
+    )
+    return conn.execute("DELETE FROM activity_daily WHERE day < ?", (before,)).rowcount
+
+async def get_user(db, user_id: int):
+    row = await db.fetchone("SELECT messages FROM users WHERE user_id = ?", (user_id,))
     return row[0] if row else 0
 
+async def get_all_users(db):
+    return await db.fetchall("SELECT user_id, messages FROM users WHERE messages > 0")
+
+async def get_window_users(db, since: int):
+    return await db.fetchall(
+        "SELECT user_id, SUM(messages) FROM activity_daily WHERE day >= ? GROUP BY user_id",
+        (since,)
+    )
+
+async def get_user_days(db, user_id: int, since: int):
+    return await db.fetchall(
+        "SELECT day, messages FROM activity_daily WHERE user_id = ? AND day >= ?",
+        (user_id, since)
+    )
+
+async def get_user_months(db, user_id: int, since: int):
+    # 圧縮済みの月別と、まだ日別に残っている分を合わせた月ごとの合計
+    return await db.fetchall(
+        "SELECT month, SUM(messages) FROM ("
+        "  SELECT month, messages FROM activity_monthly WHERE user_id = ? AND month >= ?"
+        "  UNION ALL"
+        "  SELECT day / 100, messages FROM activity_daily WHERE user_id = ? AND day >= ?"
+        ") GROUP BY month",
+        (user_id, since, user_id, since * 100)
+    )
+
+# 発言数の書き込みバッファ
+class MessageCounterBuffer:
+    """発言数をメモリ上でユーザー・日ごとにまとめ、一括UPSERTで書き込む"""
+
+    def __init__(self, db):
+        self.db = db
+        self.pending: dict[int, int] = {}
+        self.daily: dict[tuple[int, int], int] = {}
+        self.size = 0
+        self._lock = asyncio.Lock()
+
+    def add(self, user_id: int) -> bool:
+        """1件加算する。閾値に達したら True"""
+        key = (day_key(date.today()), user_id)
+        self.pending[user_id] = self.pending.get(user_id, 0) + 1
+        self.daily[key] = self.daily.get(key, 0) + 1
+        self.size += 1
+        return self.size >= FLUSH_THRESHOLD
+
+    async def flush(self):
+        async with self._lock:
+            if not self.pending:
+                return
+            batch, daily = self.pending, self.daily
+            self.pending, self.daily, self.size = {}, {}, 0
+            try:
+                await self.db.transaction(_write_counts, batch, daily)
+            except Exception:
+                # 書き込み失敗時は次回に持ち越す
+                for user_id, count in batch.items():
+                    self.pending[user_id] = self.pending.get(user_id, 0) + count
+                    self.size += count
+                for key, count in daily.items():
+                    self.daily[key] = self.daily.get(key, 0) + count
+                raise
+
+    async def get(self, user_id: int) -> int:
+        """DBの値に未書き込み分を足した正確な発言数"""
+        async with self._lock:
+            return await get_user(self.db, user_id) + self.pending.get(user_id, 0)
+
 # ランク判定
 def get_rank(messages: int):
     if messages < 10:
@@ -46,56 +152,184 @@ def get_rank(messages: int):
     else:
         return "達人", None  # 上限なし
 
-# 画像生成
-def generate_rank_card(user: discord.User, messages: int):
-    rank, next_goal = get_rank(messages)
-
-    # ベース画像
-    img = Image.new("RGB", (600, 200), (30, 30, 30))
-    draw = ImageDraw.Draw(img)
-    font = ImageFont.truetype("arial.ttf", 24)
-
-    # ユーザー名 & ランク
-    draw.text((150, 40), f"{user.display_name}", font=font, fill=(255, 255, 255))
-    draw.text((150, 80), f"ランク: {rank}", font=font, fill=(200, 200, 200))
-
-    # 発言数と進捗バー
-    if next_goal:
-        progress = messages / next_goal
-        bar_length = int(400 * progress)
-        draw.rectangle([150, 130, 150+bar_length, 150], fill=(0, 200, 0))
-        draw.rectangle([150, 130, 550, 150], outline=(255, 255, 255))
-        draw.text((150, 160), f"{messages}/{next_goal}", font=font, fill=(180, 180, 180))
-    else:
-        draw.text((150, 130), f"{messages} (MAX!)", font=font, fill=(255, 215, 0))
+# ランキングのページ送り
+class LeaderboardPager(discord.ui.View):
+    def __init__(self, cog, index: RankIndex, period: str, page: int):
+        super().__init__(timeout=120)
+        self.cog = cog
+        self.index = index
+        self.period = period
+        self.page = page
+
+    async def update(self, interaction: discord.Interaction):
+        # アイコンの取得と描画で3秒を超えることがあるので先に応答しておく
+        await interaction.response.defer()
+        embed, file = await self.cog.build_leaderboard(
+            interaction.guild, interaction.user, self.index, self.period, self.page
+        )
+        await interaction.edit_original_response(embed=embed, attachments=[file], view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.gray)
+    async def prev(self, interaction: discord.Interaction, _):
+        self.page = max(1, self.page - 1)
+        await self.update(interaction)
 
-    # アイコン描画
-    pfp = Image.open(io.BytesIO(user.display_avatar.read())).resize((100, 100))
-    img.paste(pfp, (30, 50))
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.gray)
+    async def next(self, interaction: discord.Interaction, _):
+        self.page = min(self.index.page_count(LEADERBOARD_PER_PAGE), self.page + 1)
+        await self.update(interaction)
 
-    # 画像をDiscord送信用に変換
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-    return buffer
+PERIOD_TITLES = {
+    "normal": "🏆 発言数ランキング",
+    "weekly": "🏆 今週の発言数ランキング",
+    "monthly": "🏆 今月の発言数ランキング",
+}
 
 class RankCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        init_db()
+        self.db = bot.storage.get(DB_PATH)
+        self.buffer = MessageCounterBuffer(self.db)
+        self.index = RankIndex()
+        self.renderer = RankCardRenderer()
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
+    async def cog_load(self):
+        await init_db(self.db)
+        self.index.load(await get_all_users(self.db))
+        self.flush_loop.start()
+        self.compact_loop.start()
+        self.route = self.bot.dispatcher.register(self.handle_message, name="rank")
+
+    async def cog_unload(self):
+        self.bot.dispatcher.unregister(self.route)
+        # 終了時は必ず残りを書き込む
+        self.flush_loop.cancel()
+        self.compact_loop.cancel()
+        await self.buffer.flush()
+        self.renderer.close()
+
+    @tasks.loop(seconds=FLUSH_INTERVAL)
+    async def flush_loop(self):
+        try:
+            await self.buffer.flush()
+        except Exception as e:
+            print("❌ rank 書き込み失敗:", e)
+
+    @tasks.loop(hours=24)
+    async def compact_loop(self):
+        # 保持期間を過ぎた月は丸ごと月別へ移す（今月・先月分は日別のまま）
+        cutoff = date.today() - timedelta(days=DAILY_RETENTION_DAYS)
+        before = day_key(cutoff.replace(day=1))
+        try:
+            await self.buffer.flush()
+            removed = await self.db.transaction(_compact_daily, before)
+        except Exception as e:
+            print("❌ rank 日別データの圧縮失敗:", e)
             return
-        add_message(message.author.id)
+        if removed:
+            print(f"🗜 rank 日別データを月別にまとめました: {removed}件")
+
+    async def get_period_index(self, period: str) -> RankIndex:
+        if period == "normal":
+            return self.index
+
+        today = date.today()
+        if period == "weekly":
+            since = today - timedelta(days=today.weekday())
+        else:
+            since = today.replace(day=1)
+
+        # 期間集計は未書き込み分を先に反映してから行う
+        await self.buffer.flush()
+        index = RankIndex()
+        index.load(await get_window_users(self.db, day_key(since)))
+        return index
+
+    async def handle_message(self, message):
+        self.index.add(message.author.id)
+        if self.buffer.add(message.author.id):
+            await self.buffer.flush()
+
+    async def build_leaderboard(self, guild: discord.Guild, viewer: discord.abc.User,
+                                index: RankIndex, period: str, page: int):
+        entries = []
+        for position, user_id, messages in index.page(page, LEADERBOARD_PER_PAGE):
+            user = (guild.get_member(user_id) if guild else None) or self.bot.get_user(user_id)
+            name = user.display_name if user else "不明なユーザー"
+            entries.append((position, user, name, messages))
+
+        buffer = await self.renderer.render_leaderboard(entries)
+        file = discord.File(buffer, filename="leaderboard.png")
+
+        position = index.position(viewer.id)
+        embed = discord.Embed(title=PERIOD_TITLES[period], color=discord.Color.gold())
+        embed.set_image(url="attachment://leaderboard.png")
+        embed.set_footer(
+            text=f"ページ {page}/{index.page_count(LEADERBOARD_PER_PAGE)}"
+                 f"│あなたの順位 : {f'{position}位' if position else '記録なし'}"
+        )
+        return embed, file
 
     @commands.hybrid_command(name="rank", description="自分のランクを表示する")
     async def rank(self, ctx: commands.Context):
-        messages = get_user(ctx.author.id)
-        buffer = generate_rank_card(ctx.author, messages)
+        messages = await self.buffer.get(ctx.author.id)
+        rank, next_goal = get_rank(messages)
+        position = self.index.position(ctx.author.id)
+        buffer = await self.renderer.render_card(ctx.author, rank, messages, next_goal, position)
         file = discord.File(buffer, filename="rank.png")
         await ctx.reply(file=file)
 
+    @commands.hybrid_command(name="leaderboard", description="発言数ランキングを表示する")
+    @app_commands.describe(period="normal: 累計 / weekly: 今週 / monthly: 今月", page="ページ番号")
+    async def leaderboard(self, ctx: commands.Context,
+                          period: Literal["normal", "weekly", "monthly"] = "normal", page: int = 1):
+        # 期間集計と画像の描画で3秒を超えることがあるので先に応答しておく
+        await ctx.defer()
+        index = await self.get_period_index(period)
+        if not len(index):
+            return await ctx.reply("📊 まだランキングデータがありません。")
+
+        page = min(max(1, page), index.page_count(LEADERBOARD_PER_PAGE))
+        embed, file = await self.build_leaderboard(ctx.guild, ctx.author, index, period, page)
+        await ctx.reply(embed=embed, file=file, view=LeaderboardPager(self, index, period, page))
+
+    @commands.hybrid_command(name="activity", description="直近の発言数の推移を表示する")
+    async def activity(self, ctx: commands.Context, member: discord.Member = None):
+        member = member or ctx.author
+        today = date.today()
+        month_start = today.replace(day=1)
+        week_start = today - timedelta(days=today.weekday())
+        since = min(month_start, today - timedelta(days=ACTIVITY_DAYS - 1))
+
+        await self.buffer.flush()
+        days = dict(await get_user_days(self.db, member.id, day_key(since)))
+        months = dict(await get_user_months(self.db, member.id, month_key(today, ACTIVITY_MONTHS - 1)))
+
+        lines = []
+        for i in range(ACTIVITY_DAYS - 1, -1, -1):
+            d = today - timedelta(days=i)
+            count = days.get(day_key(d), 0)
+            lines.append(f"`{d.strftime('%m/%d')}` {'▇' * min(count // 5, 20)} {count}")
+
+        week_total = sum(v for k, v in days.items() if k >= day_key(week_start))
+        month_total = sum(v for k, v in days.items() if k >= day_key(month_start))
+
+        embed = discord.Embed(
+            title=f"📈 {member.display_name} の発言数推移",
+            description="\n".join(lines),
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="今週", value=f"{week_total}件")
+        embed.add_field(name="今月", value=f"{month_total}件")
+        embed.add_field(
+            name=f"月別（直近{ACTIVITY_MONTHS}か月）",
+            value="\n".join(
+                f"`{key // 100}/{key % 100:02d}` {months.get(key, 0)}件"
+                for key in (month_key(today, i) for i in range(ACTIVITY_MONTHS - 1, -1, -1))
+            ),
+            inline=False
+        )
+        await ctx.reply(embed=embed)
+
 async def setup(bot):
     await bot.add_cog(RankCog(bot))
\ No newline at end of file
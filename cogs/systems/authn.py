@@ -387,6 +387,12 @@ class VerificationCog(commands.Cog):
     # 再起動後でもすぐボタンが機能するように、ロード時に永続ビューを登録
     async def cog_load(self):
         self.bot.add_view(VerifyView())
+        self.route = self.bot.dispatcher.register(
+            self.handle_message, name="authn", channels={VERIFY_CHANNEL_ID}, guild_only=True
+        )
+
+    async def cog_unload(self):
+        self.bot.dispatcher.unregister(self.route)
 
     @commands.command(name="post_authn")
     @commands.has_permissions(administrator=True)
@@ -410,14 +416,8 @@ class VerificationCog(commands.Cog):
         await channel.send(embed=embed, view=VerifyView())
         await ctx.message.add_reaction("✅")
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        """キーワード検証とロール付与"""
-        if message.author.bot or not message.guild:
-            return
-        if message.channel.id != VERIFY_CHANNEL_ID:
-            return
-
+    async def handle_message(self, message: discord.Message):
+        """キーワード検証とロール付与（認証チャンネルの発言のみ dispatcher から呼ばれる）"""
         user_id = message.author.id
 
         # 整形ルールは元コードを踏襲
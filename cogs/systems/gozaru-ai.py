@@ -1,13 +1,23 @@
-import json
+import re
 import aiohttp
+import json
+import unicodedata
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import os
 from dotenv import load_dotenv
 import asyncio
+import contextlib
+import time
 import traceback
-import sqlite3
-from datetime import datetime
+from collections import deque
+from datetime import datetime, timedelta
+
+from utils.ai_queue import BUSY, AIRequestQueue
+from utils.alias_matcher import MemberResolver
+from utils.cache import SingleFlight, TTLCache
+from utils.llm_backends import BackendError, create_backend
+from utils.prompt_builder import PromptBuilder
 
 load_dotenv(dotenv_path="ci/.env") # .envファイルをすべて読み込む
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -18,157 +28,283 @@ WEBHOOK_NAME = os.getenv("WEBHOOK_NAME")
 USER_MAX_LENGTH = int(os.getenv("USER_MAX_LENGTH"))
 GEMINI_MAX_LENGTH = int(os.getenv("GEMINI_MAX_LENGTH"))
 
+# 応答を作るバックエンド: gemini / stub（tools/gemini_stub.py など）/ canned（通信なしの定型文）
+AI_BACKEND = os.getenv("AI_BACKEND", "gemini")
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE")
+AI_STUB_URL = os.getenv("AI_STUB_URL")
+# 届いた分から投稿して編集で続きを足す（0で全文がそろってから投稿）
+AI_STREAM = os.getenv("AI_STREAM", "1") == "1"
+AI_STREAM_EDIT_INTERVAL = float(os.getenv("AI_STREAM_EDIT_INTERVAL", "1.5"))  # 編集の最短間隔（秒）
+# 同時に処理する数・待てる数・1人あたりの連投制限（burst 回まで、refill 秒ごとに1回分回復）
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "3"))
+AI_QUEUE_SIZE = int(os.getenv("AI_QUEUE_SIZE", "20"))
+AI_USER_BURST = int(os.getenv("AI_USER_BURST", "3"))
+AI_USER_REFILL = float(os.getenv("AI_USER_REFILL", "20"))
+AI_BUSY_NOTICE_INTERVAL = 15  # 混雑中の返信を出す最短間隔（秒）
+AI_BUSY_REPLY = "今ちょっと混み合ってるでござる…少し待ってからもう一度話しかけてほしいでござる！"
+
 DEFAULT_CHARACTER = "data_public/ai-image.txt"
 HOLO_JSON = "data_public/holomembers.json"
 
 DB_PATH = "data/ai_memory.db"
 MEMORY_LIMIT = 10  # 直近何往復分使うか
+MEMORY_RETENTION_DAYS = 30  # これより古い会話はDBから消す
+
+RESPONSE_CACHE_SIZE = 256   # 覚えておく回答の数
+RESPONSE_CACHE_TTL = 600    # 同じ質問に同じ回答を返す秒数
+AI_ERROR_REPLY = "（AI 応答エラー）"
+
+
+def normalize_question(text: str) -> str:
+    """全角半角・大文字小文字・空白・末尾の記号の違いを吸収したキャッシュ用の質問文"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?!.。、 ~")
 
 
 class TalkCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.init_db()
+        self.db = bot.storage.get(DB_PATH)
+        # 名前・呼び方の照合（holomembers.json が更新されたときだけ作り直す）
+        self.members = MemberResolver(HOLO_JSON)
+        # キャラクター設定は ai-image.txt が更新されたときだけ読み直す
+        self.prompts = PromptBuilder(DEFAULT_CHARACTER)
+        # (正規化した質問, 判定したメンバー名) -> 回答。使い回した回答は会話履歴に入れない
+        self.responses = TTLCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+        self.inflight = SingleFlight()
+        self.cache_stats = {"hits": 0, "misses": 0}
+        # channel_id -> 直近の (role, content)。DBへは書き込みと同時に保存
+        self.memory: dict[int, deque] = {}
+        # 発言はいったん待ち行列に入れ、決まった数のワーカーで順に処理する
+        self.requests = AIRequestQueue(
+            self.process_message,
+            concurrency=AI_CONCURRENCY,
+            maxsize=AI_QUEUE_SIZE,
+            user_burst=AI_USER_BURST,
+            user_refill=AI_USER_REFILL,
+            enabled=lambda: getattr(self.bot, "talk_enabled", True)
+        )
+        self.last_busy_notice = 0.0
+
+    async def cog_load(self):
+        await self.init_db()
+        self.backend = create_backend(
+            AI_BACKEND,
+            self.bot.http_session,
+            api_key=GEMINI_API_KEY,
+            api_base=GEMINI_API_BASE,
+            stub_base=AI_STUB_URL
+        )
+        self.prune_memory_loop.start()
+        self.requests.start()
+        self.route = self.bot.dispatcher.register(
+            self.handle_message, name="gozaru-ai", channels={TARGET_CHANNEL_ID}
+        )
+
+    async def cog_unload(self):
+        self.bot.dispatcher.unregister(self.route)
+        self.prune_memory_loop.cancel()
+        await self.requests.close()
 
     # ===== DB =====
-    def init_db(self):
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("""
+    async def init_db(self):
+        await self.db.executescript("""
             CREATE TABLE IF NOT EXISTS memory (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 channel_id INTEGER,
                 role TEXT,
                 content TEXT,
                 timestamp TEXT
-            )
+            );
+            CREATE INDEX IF NOT EXISTS idx_memory_channel ON memory (channel_id, id);
         """)
-        conn.commit()
-        conn.close()
 
-    def save_memory(self, channel_id: int, role: str, content: str):
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute(
+    async def get_history(self, channel_id: int) -> deque:
+        """チャンネルの直近の会話（初回だけDBから読み込む）"""
+        history = self.memory.get(channel_id)
+        if history is None:
+            rows = await self.db.fetchall(
+                "SELECT role, content FROM memory WHERE channel_id=? ORDER BY id DESC LIMIT ?",
+                (channel_id, MEMORY_LIMIT * 2)
+            )
+            # 読み込み中に別の発言で作られていたらそちらを使う
+            history = self.memory.setdefault(channel_id, deque(reversed(rows), maxlen=MEMORY_LIMIT * 2))
+        return history
+
+    async def save_exchange(self, channel_id: int, question: str, reply: str):
+        """質問と回答の1往復をまとめて記録する"""
+        history = await self.get_history(channel_id)
+        # 2つの間に await を挟まないので、同時に答えた別の会話が間に入らない
+        history.append(("user", question))
+        history.append(("model", reply))
+        now = datetime.utcnow().isoformat()
+        await self.db.executemany(
             "INSERT INTO memory (channel_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
-            (channel_id, role, content, datetime.utcnow().isoformat())
+            [(channel_id, "user", question, now), (channel_id, "model", reply, now)]
         )
-        conn.commit()
-        conn.close()
-
-    def load_memory(self, channel_id: int) -> str:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute(
-            "SELECT role, content FROM memory WHERE channel_id=? ORDER BY id DESC LIMIT ?",
-            (channel_id, MEMORY_LIMIT * 2)
-        )
-        rows = c.fetchall()
-        conn.close()
 
-        rows.reverse()
+    async def load_memory(self, channel_id: int) -> str:
         lines = []
-        for role, content in rows:
+        for role, content in await self.get_history(channel_id):
             prefix = "ユーザー" if role == "user" else "AI"
             lines.append(f"{prefix}: {content}")
 
         return "\n".join(lines)
 
-    # ===== Holomembers =====
-    def load_holomembers(self):
-        with open(HOLO_JSON, "r", encoding="utf-8") as f:
-            return json.load(f)
-
-    def resolve_name(self, text: str, members: dict):
-        for official, aliases in members.items():
-            if official in text:
-                return official
-            for a in aliases:
-                if a in text:
-                    return official
-        return None
-
-    # ===== Gemini =====
-    async def ask_gemini(self, prompt: str) -> str:
-        url = "https://generativelanguage.googleapis.com/v1/models/gemini-2.5-flash-lite:generateContent"
-
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {"maxOutputTokens": GEMINI_MAX_LENGTH}
-        }
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url,
-                params={"key": GEMINI_API_KEY},
-                json=payload,
-                timeout=30
-            ) as resp:
+    @tasks.loop(hours=24)
+    async def prune_memory_loop(self):
+        # 直近の会話はメモリ上にあるので、古い行はDBから消すだけでよい
+        cutoff = (datetime.utcnow() - timedelta(days=MEMORY_RETENTION_DAYS)).isoformat()
+        try:
+            removed = await self.db.execute("DELETE FROM memory WHERE timestamp < ?", (cutoff,))
+        except Exception as e:
+            print("❌ AI会話履歴の整理失敗:", e)
+            return
+        if removed:
+            print(f"🗜 AI会話履歴を整理しました: {removed}件")
 
-                text = await resp.text()
-                if resp.status != 200:
-                    return "（AI 応答エラー）"
+    # ===== Holomembers =====
+    def resolve_name(self, text: str):
+        """文中で一番長く一致した名前・呼び方の正式名"""
+        return self.members.resolve(text)
 
-                data = json.loads(text)
-                return data["candidates"][0]["content"]["parts"][0]["text"]
+    # ===== LLM =====
+    async def ask_gemini(self, prompt: str) -> str:
+        """全文がそろってから返す（失敗したら AI_ERROR_REPLY）"""
+        self.prompts.stats.record_prompt(prompt)
+        try:
+            text, usage = await self.backend.generate(prompt, GEMINI_MAX_LENGTH)
+        except BackendError as e:
+            print("❌ AI 応答エラー:", e)
+            return AI_ERROR_REPLY
+        self.prompts.stats.record_usage(usage)
+        return text
+
+    async def stream_gemini(self, prompt: str):
+        """届いた分から文章を順に返す"""
+        self.prompts.stats.record_prompt(prompt)
+        async with contextlib.aclosing(self.backend.stream(prompt, GEMINI_MAX_LENGTH)) as chunks:
+            async for text, usage in chunks:
+                self.prompts.stats.record_usage(usage)
+                if text:
+                    yield text
+
+    async def stream_reply(self, prompt: str) -> tuple[str, bool]:
+        """
+        最初のチャンクが届いたらすぐ投稿し、以降は AI_STREAM_EDIT_INTERVAL 秒ごとに編集する。
+        (最終的な文章, 最後まで受け取れたか) を返す
+        """
+        loop = asyncio.get_running_loop()
+        text = shown = ""
+        sent = None
+        last_edit = 0.0
+        complete = True
+
+        try:
+            # 投稿・編集の失敗で抜けたときも、すぐに応答（接続）を閉じる
+            async with contextlib.aclosing(self.stream_gemini(prompt)) as chunks:
+                async for chunk in chunks:
+                    text = (text + chunk)[:GEMINI_MAX_LENGTH]
+                    if sent is None:
+                        sent = await self.post_webhook_reply(text, wait=True)
+                        shown, last_edit = text, loop.time()
+                    elif text != shown and loop.time() - last_edit >= AI_STREAM_EDIT_INTERVAL:
+                        await sent.edit(content=text)
+                        shown, last_edit = text, loop.time()
+        except (BackendError, aiohttp.ClientError, asyncio.TimeoutError,
+                json.JSONDecodeError, discord.HTTPException) as e:
+            # 途中まで届いていればそこまでを残す（壊れたSSE行や投稿・編集の失敗も同じ）
+            print("❌ AI ストリーミング失敗:", e)
+            complete = False
+
+        if not text:
+            text = AI_ERROR_REPLY
+        try:
+            if sent is None:
+                await self.post_webhook_reply(text)
+            elif text != shown:
+                await sent.edit(content=text)
+        except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print("❌ AI 応答の投稿失敗:", e)
+            complete = False
+        return text, complete
+
+    async def _stream_and_cache(self, key, prompt: str) -> str:
+        reply, complete = await self.stream_reply(prompt)
+        if complete and reply != AI_ERROR_REPLY:
+            self.responses.put(key, reply)
+        return reply
+
+    async def answer(self, key, prompt: str) -> tuple[str, bool]:
+        """
+        キャッシュ済みの回答か、同じ質問の実行中の呼び出しがあればその結果を使う。
+        (回答, この呼び出しで作った回答か) を返す
+        """
+        reply = self.responses.get(key)
+        if reply is not None:
+            self.cache_stats["hits"] += 1
+            return reply, False
+
+        self.cache_stats["misses"] += 1
+        fresh = key not in self.inflight
+        return await self.inflight.run(key, lambda: self._ask_and_cache(key, prompt)), fresh
+
+    async def _ask_and_cache(self, key, prompt: str) -> str:
+        reply = await self.ask_gemini(prompt)
+        if reply != AI_ERROR_REPLY:
+            self.responses.put(key, reply)
+        return reply
 
     # ===== Webhook =====
-    async def post_webhook_reply(self, message: discord.Message, content: str):
-        payload = {
-            "content": content,
-            "username": WEBHOOK_NAME,
-            "allowed_mentions": {"parse": []},
-            "message_reference": {
-                "message_id": str(message.id),
-                "channel_id": str(message.channel.id)
-            }
-        }
-
-        async with aiohttp.ClientSession() as session:
-            await session.post(WEBHOOK_URL, json=payload)
+    async def post_webhook_reply(self, content: str, wait: bool = False):
+        """wait=True なら編集に使う WebhookMessage を返す"""
+        # Webhookは返信（message_reference）に対応していないので通常の投稿として送る
+        return await self.bot.webhooks.send(
+            WEBHOOK_URL,
+            content=content,
+            username=WEBHOOK_NAME,
+            allowed_mentions=discord.AllowedMentions.none(),
+            wait=wait
+        )
 
     # ===== Listener =====
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-
-        if message.author.bot:
-            return
-        if message.channel.id != TARGET_CHANNEL_ID:
-            return
+    async def handle_message(self, message: discord.Message):
+        # Botの発言・対象外チャンネルは dispatcher 側で除外済み
         if not message.content.strip():
             return
-        members = self.load_holomembers()
-        found_name = self.resolve_name(message.content, members)
-
-        with open(DEFAULT_CHARACTER, "r", encoding="utf-8") as f:
-            system_prompt = f.read().strip()
-        if not found_name:
-            prompt = f"""
-    {system_prompt}
 
-    質問文に含まれる名前は、公式に確認できないでござる。
-    JSONに存在する情報のみを元に、
-    「分からないことは分からない」と優しく伝えてください。
-
-    ユーザー: {message.content}
-    """
+        # 停止中（P!ai_off）・連投は黙って捨て、混雑時だけ間隔をあけて知らせる
+        if self.requests.submit(message.author.id, message) == BUSY:
+            now = time.monotonic()
+            if now - self.last_busy_notice >= AI_BUSY_NOTICE_INTERVAL:
+                self.last_busy_notice = now
+                await self.post_webhook_reply(AI_BUSY_REPLY)
+
+    async def process_message(self, message: discord.Message):
+        """待ち行列から取り出された発言に答える"""
+        found_name = self.resolve_name(message.content)
+        history = await self.load_memory(message.channel.id)
+        if history:
+            history = f"これまでの会話:\n{history}\n"
+
+        prompt = self.prompts.build(message.content, found_name, history)
+
+        # キャッシュは履歴を見ずに質問と名前だけで引く
+        key = (normalize_question(message.content), found_name)
+        if AI_STREAM and self.responses.get(key) is None and key not in self.inflight:
+            # 最初の1人だけストリーミングで投稿し、同時に来た同じ質問は完成した文章を受け取る
+            self.cache_stats["misses"] += 1
+            reply = await self.inflight.run(key, lambda: self._stream_and_cache(key, prompt))
+            fresh = True
         else:
-            prompt = f"""
-    {system_prompt}
-
-    質問に含まれる人物は
-    「{found_name}」でござる。
-
-    JSONで確認できた正式名と一般的な呼び方を使い、
-    風真いろはとして100〜200文字以内で答えてください。
-
-    ユーザー: {message.content}
-    """
-
-        reply = await self.ask_gemini(prompt)
-        reply = reply[:GEMINI_MAX_LENGTH]
+            reply, fresh = await self.answer(key, prompt)
+            reply = reply[:GEMINI_MAX_LENGTH]
+            await self.post_webhook_reply(reply)
 
-        await self.post_webhook_reply(message, reply)
+        # 失敗した応答と、別の会話向けに作られた回答（キャッシュ・相乗り）は次の会話の文脈に入れない
+        if fresh and reply != AI_ERROR_REPLY:
+            await self.save_exchange(message.channel.id, message.content[:USER_MAX_LENGTH], reply)
 
 
 
@@ -26,6 +26,29 @@ class VoiceRoomManager(commands.Cog):
         with open(DATA_FILE, "r", encoding="utf-8") as f:
             self.rooms = json.load(f)
 
+        # 逆引き用の索引（voice_id / text_id -> 部屋主のID）。self.rooms と同時に更新する
+        self.by_voice: dict[int, str] = {}
+        self.by_text: dict[int, str] = {}
+        for owner_id, data in self.rooms.get("active", {}).items():
+            self.by_voice[data["voice_id"]] = owner_id
+            self.by_text[data["text_id"]] = owner_id
+
+    def add_room(self, owner_id: str, voice_id: int, text_id: int):
+        # 同じ人が作り直した場合は前の部屋を索引から外す
+        self.remove_room(owner_id)
+        self.rooms.setdefault("active", {})[owner_id] = {
+            "voice_id": voice_id,
+            "text_id": text_id
+        }
+        self.by_voice[voice_id] = owner_id
+        self.by_text[text_id] = owner_id
+
+    def remove_room(self, owner_id: str):
+        data = self.rooms.get("active", {}).pop(owner_id, None)
+        if data:
+            self.by_voice.pop(data["voice_id"], None)
+            self.by_text.pop(data["text_id"], None)
+
     def save(self):
         with open(DATA_FILE, "w", encoding="utf-8") as f:
             json.dump(self.rooms, f, indent=4, ensure_ascii=False)
@@ -42,16 +65,21 @@ class VoiceRoomManager(commands.Cog):
         if not before.channel:
             return
 
-        for owner_id, data in list(self.rooms.get("active", {}).items()):
-            if before.channel.id == data["voice_id"]:
-                if len(before.channel.members) == 0:
-                    text = member.guild.get_channel(data["text_id"])
-                    await before.channel.delete()
-                    if text:
-                        await text.delete()
+        # 個室かどうかは索引で1回引くだけ
+        owner_id = self.by_voice.get(before.channel.id)
+        if owner_id is None:
+            return
+
+        if len(before.channel.members) == 0:
+            data = self.rooms["active"][owner_id]
+            # 削除を待つあいだに同じ退室イベントが重ならないよう先に外す
+            self.remove_room(owner_id)
+            self.save()
 
-                    del self.rooms["active"][owner_id]
-                    self.save()
+            text = member.guild.get_channel(data["text_id"])
+            await before.channel.delete()
+            if text:
+                await text.delete()
 
     # -----------------------------
     #   個室作成
@@ -70,13 +98,7 @@ class VoiceRoomManager(commands.Cog):
             category=category
         )
 
-        if "active" not in self.rooms:
-            self.rooms["active"] = {}
-
-        self.rooms["active"][str(member.id)] = {
-            "voice_id": voice.id,
-            "text_id": text.id
-        }
+        self.add_room(str(member.id), voice.id, text.id)
         self.save()
 
         await text.send(
@@ -110,10 +132,11 @@ class VoiceRoomManager(commands.Cog):
             self.cog = cog
 
         def get_room(self, interaction):
-            if not interaction.message.mentions:
+            # パネルは個室のテキストチャンネルにあるので、チャンネルIDから部屋を引く
+            owner_id = self.cog.by_text.get(interaction.channel_id)
+            if owner_id is None:
                 return None
-            owner_id = interaction.message.mentions[0].id
-            return owner_id, self.cog.rooms.get("active", {}).get(str(owner_id))
+            return int(owner_id), self.cog.rooms["active"][owner_id]
 
         @discord.ui.button(
             label="🖊 名前変更",
@@ -15,21 +15,20 @@ class RoleMentionVCCheck(commands.Cog):
         self.target_channel_id = CHECK_MENTION_CHANNEL  
         self.target_role_id = CHECK_MENTION_ROLE_ID    
 
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        # Bot自身やDMは無視
-        if message.author.bot or message.guild is None:
-            return
-        
-        # 指定チャンネルのみ
-        if message.channel.id != self.target_channel_id:
-            return
-        
-        # 指定ロールがメンションされていない場合スルー
-        role_ids = [role.id for role in message.role_mentions]
-        if self.target_role_id not in role_ids:
-            return
-        
+    async def cog_load(self):
+        # 指定チャンネルで指定ロールがメンションされたときだけ dispatcher から呼ばれる
+        self.route = self.bot.dispatcher.register(
+            self.handle_message,
+            name="mention-check-vc",
+            channels={self.target_channel_id},
+            role_mentions={self.target_role_id},
+            guild_only=True
+        )
+
+    async def cog_unload(self):
+        self.bot.dispatcher.unregister(self.route)
+
+    async def handle_message(self, message: discord.Message):
         # VCに接続しているか確認
         voice_state = message.author.voice
         if voice_state is None or voice_state.channel is None:
@@ -13,6 +13,18 @@ class Emoji(commands.Cog):
         self.bot = bot
         self.data = self.load_data()
 
+    async def cog_load(self):
+        self.route = self.bot.dispatcher.register(self.handle_message, name="react-emoji", channels=())
+        self.sync_route()
+
+    async def cog_unload(self):
+        self.bot.dispatcher.unregister(self.route)
+
+    def sync_route(self):
+        # 自動リアクションが有効なチャンネルだけ dispatcher から呼ばれるようにする
+        channels = {int(cid) for cid, config in self.data.items() if config.get("enabled")}
+        self.bot.dispatcher.set_channels(self.route, channels)
+
     # ===== JSON =====
     def load_data(self):
         if not os.path.exists(DATA_PATH):
@@ -23,13 +35,10 @@ class Emoji(commands.Cog):
     def save_data(self):
         with open(DATA_PATH, "w", encoding="utf-8") as f:
             json.dump(self.data, f, ensure_ascii=False, indent=2)
+        self.sync_route()
 
     # ===== Events =====
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if message.author.bot:
-            return
-
+    async def handle_message(self, message: discord.Message):
         cid = str(message.channel.id)
         config = self.data.get(cid)
 
@@ -1,7 +1,8 @@
 import discord
 from discord.ext import commands, tasks
-import json
 import aiohttp
+import asyncio
+import json
 from datetime import datetime, timezone, time
 import pytz
 import os
@@ -72,17 +73,16 @@ class TikTokNotifyCog(commands.Cog):
             "count": 1
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                TIKTOK_API_URL,
-                headers=headers,
-                params=params
-            ) as r:
-                try:
-                    data = await r.json()
-                except Exception as e:
-                    print("❌ JSON 解析失敗:", e)
-                    return None
+        async with self.bot.http_session.get(
+            TIKTOK_API_URL,
+            headers=headers,
+            params=params
+        ) as r:
+            try:
+                data = await r.json()
+            except Exception as e:
+                print("❌ JSON 解析失敗:", e)
+                return None
 
         try:
             video = data["data"]["videos"][0]
@@ -102,33 +102,40 @@ class TikTokNotifyCog(commands.Cog):
     # ------------------
     # Discord Webhook 送信（Embed）
     # ------------------
-    async def send_discord_notification(self, video: dict):
-        payload = {
-            "content": f"<@&{TIKTOK_MENTION_ROLE_ID}>",
-            "embeds": [
-                {
-                    "color": 0x0000FF,
-                    "author": {
-                        "name": "TikTokで最新動画が投稿されました！",
-                        "url": f"https://www.tiktok.com/@{TIKTOK_USERNAME}"
-                    },
-                    "title": video["desc"] or "新しい動画",
-                    "url": video["url"],
-                    "image": {
-                        "url": video.get("thumbnail")
-                    },
-                    "footer": {
-                        "text": "Published",
-                        "icon_url": "https://sapph.xyz/images/socials/sapphire_tiktok.png"
-                    },
-                    "timestamp": datetime.now(timezone.utc).isoformat()
-                }
-            ]
-        }
+    async def send_discord_notification(self, video: dict) -> bool:
+        embed = discord.Embed.from_dict(
+            {
+                "color": 0x0000FF,
+                "author": {
+                    "name": "TikTokで最新動画が投稿されました！",
+                    "url": f"https://www.tiktok.com/@{TIKTOK_USERNAME}"
+                },
+                "title": video["desc"] or "新しい動画",
+                "url": video["url"],
+                "image": {
+                    "url": video.get("thumbnail")
+                },
+                "footer": {
+                    "text": "Published",
+                    "icon_url": "https://sapph.xyz/images/socials/sapphire_tiktok.png"
+                },
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            }
+        )
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(TIKTOK_WEBHOOK_URL, json=payload) as r:
-                print("📨 Webhook status:", r.status)
+        # 再試行しても送れなかったときはループを止めず、次回また送る
+        try:
+            await self.bot.webhooks.send(
+                TIKTOK_WEBHOOK_URL,
+                content=f"<@&{TIKTOK_MENTION_ROLE_ID}>",
+                embed=embed
+            )
+        except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print("❌ Webhook 送信失敗:", video["id"], e)
+            return False
+
+        print("📨 Webhook 送信完了:", video["id"])
+        return True
 
     # ------------------
     # 定期チェック（30分間隔）
@@ -145,8 +152,8 @@ class TikTokNotifyCog(commands.Cog):
 
         last_saved = self.load_last_video_id()
         if latest["id"] != last_saved:
-            await self.send_discord_notification(latest)
-            self.save_last_video_id(latest["id"])
+            if await self.send_discord_notification(latest):
+                self.save_last_video_id(latest["id"])
 
     @check_tiktok.before_loop
     async def before_check(self):
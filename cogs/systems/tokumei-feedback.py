@@ -3,7 +3,6 @@ from discord.ext import commands
 import json
 import os
 from datetime import datetime
-import aiohttp
 from dotenv import load_dotenv
 
 load_dotenv("ci/.env")
@@ -62,29 +61,20 @@ class AnonymousBox(commands.Cog):
         )
         await ctx.send(embed=embed, view=AnonymousButton(self))
 
-    # Webhook① 更新
+    # Webhook① 更新（溜まった通知は1通にまとめて送る）
     async def update_main_webhook_message(self, text: str):
-        async with aiohttp.ClientSession() as session:
-            webhook = discord.Webhook.from_url(
-                self.webhook_main_url,
-                session=session
-            )
-            await webhook.send(text)
+        self.bot.webhooks.post(self.webhook_main_url, merge_key=text, content=text)
 
     # Webhook② 匿名送信（ここが最重要）
     async def send_anonymous_message(self, user: discord.User, text: str):
         number = self.get_anonymous_number(user.id)
 
-        async with aiohttp.ClientSession() as session:
-            webhook = discord.Webhook.from_url(
-                self.webhook_send_url,
-                session=session
-            )
-            await webhook.send(
-                content=text,
-                username=f"匿名{number}",
-                avatar_url=user.display_avatar.url
-            )
+        await self.bot.webhooks.send(
+            self.webhook_send_url,
+            content=text,
+            username=f"匿名{number}",
+            avatar_url=user.display_avatar.url
+        )
 
         return number
 
@@ -103,6 +93,9 @@ class AnonymousModal(discord.ui.Modal, title="匿名メッセージ送信"):
         self.cog = cog
 
     async def on_submit(self, interaction: discord.Interaction):
+        # Webhook の送信待ちで3秒を超えないよう、先に応答しておく
+        await interaction.response.defer(ephemeral=True)
+
         num = await self.cog.send_anonymous_message(
             interaction.user,
             self.message.value
@@ -110,7 +103,7 @@ class AnonymousModal(discord.ui.Modal, title="匿名メッセージ送信"):
 
         await self.cog.update_main_webhook_message("📮 新しい匿名投稿があります")
 
-        await interaction.response.send_message(
+        await interaction.followup.send(
             f"匿名{num} として送信しました。",
             ephemeral=True
         )
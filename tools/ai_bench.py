@@ -0,0 +1,191 @@
+"""
+AIチャット（gozaru-ai）の処理全体をネットワークなしで流して計測する
+
+    python tools/ai_bench.py --messages 500 --rate 50
+    python tools/ai_bench.py --backend stub --stub-url http://127.0.0.1:8089   # tools/gemini_stub.py を使う
+
+TalkCog をそのまま読み込み、名前の照合・プロンプト組み立て・待ち行列・応答生成・Webhook投稿
+（投稿は --post-latency 秒かかる偽物）までを通す。DBは一時ディレクトリに作る。
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUESTIONS = [
+    "みこちって誰？",
+    "すいちゃんの誕生日は？",
+    "フブキとミオの関係を教えて",
+    "あくあの卒業について",
+    "ござるさんの好きな食べ物は？",
+    "今日のおすすめ配信ある？",
+]
+
+
+# =====================
+# 偽のDiscordオブジェクト
+# =====================
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.bot = False
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+
+
+class FakeMessage:
+    def __init__(self, content: str, user_id: int, channel_id: int):
+        self.content = content
+        self.author = FakeUser(user_id)
+        self.channel = FakeChannel(channel_id)
+        self.guild = None
+        self.role_mentions = []
+
+
+class FakeWebhookMessage:
+    def __init__(self, sink):
+        self.sink = sink
+
+    async def edit(self, content: str):
+        await asyncio.sleep(self.sink.latency)
+        self.sink.edits += 1
+
+
+class WebhookSink:
+    """bot.webhooks の代わり（送信したふりをして数える）"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.posts = 0
+        self.edits = 0
+
+    async def send(self, url, *, wait=False, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.posts += 1
+        return FakeWebhookMessage(self) if wait else None
+
+
+class FakeBot:
+    def __init__(self, storage, http_session, webhooks, dispatcher):
+        self.storage = storage
+        self.dispatcher = dispatcher
+        self.http_session = http_session
+        self.webhooks = webhooks
+        self.talk_enabled = True
+
+
+# =====================
+# 計測
+# =====================
+def load_talk_module():
+    spec = importlib.util.spec_from_file_location("gozaru_ai", os.path.join(ROOT, "cogs", "systems", "gozaru-ai.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def format_latency(s: dict) -> str:
+    return f"p50 {s['p50_ms']:.1f}ms / p95 {s['p95_ms']:.1f}ms / p99 {s['p99_ms']:.1f}ms / 最大 {s['max_ms']:.1f}ms"
+
+
+async def run(args):
+    import aiohttp
+    from utils.dispatcher import MessageDispatcher
+    from utils.storage import Storage
+
+    talk = load_talk_module()
+    storage = Storage()
+    sink = WebhookSink(args.post_latency)
+
+    async with aiohttp.ClientSession() as session:
+        bot = FakeBot(storage, session, sink, MessageDispatcher())
+        cog = talk.TalkCog(bot)
+        await cog.cog_load()
+        if args.backend == "canned":
+            cog.backend.latency = args.latency
+            cog.backend.chunk_delay = args.chunk_delay
+
+        rng = random.Random(args.seed)
+        start = time.perf_counter()
+        for i in range(args.messages):
+            question = rng.choice(QUESTIONS)
+            if args.unique:
+                question += f" ({i})"
+            # 本番と同じく dispatcher から振り分ける
+            await bot.dispatcher.dispatch(FakeMessage(question, rng.randrange(args.users), talk.TARGET_CHANNEL_ID))
+            await asyncio.sleep(1 / args.rate if args.rate else 0)
+
+        while bot.dispatcher._tasks:
+            await asyncio.sleep(0.01)
+        await cog.requests.queue.join()
+        elapsed = time.perf_counter() - start
+
+        q = cog.requests.summary()
+        p = cog.prompts.stats.summary()
+        c = cog.cache_stats
+        cog.prune_memory_loop.cancel()
+        await cog.requests.close()
+
+    await storage.close()
+
+    handled = q["completed"] + q["failed"]
+    print(f"バックエンド: {args.backend} / 送信 {args.messages}件 / {elapsed:.2f}秒")
+    print(f"処理 {handled}件 ({handled / elapsed:.1f}件/秒) / 失敗 {q['failed']}")
+    print(f"拒否: 混雑 {q['busy']} / 連投 {q['rate_limited']}  最大待ち {q['max_depth']}件")
+    print(f"待ち時間: {format_latency(q['wait'])}")
+    print(f"処理時間: {format_latency(q['run'])}")
+    print(f"キャッシュ: ヒット {c['hits']} / ミス {c['misses']} / まとめ {cog.inflight.coalesced}")
+    print(f"プロンプト: 平均 {p['avg_chars']}文字 / 最大 {p['max_chars']}文字")
+    print(f"Webhook: 投稿 {sink.posts} / 編集 {sink.edits}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AIチャットの処理全体をオフラインで計測する")
+    parser.add_argument("--backend", choices=["canned", "stub"], default="canned")
+    parser.add_argument("--stub-url", default="http://127.0.0.1:8089")
+    parser.add_argument("--messages", type=int, default=200, help="流す発言の数")
+    parser.add_argument("--users", type=int, default=50, help="発言するユーザーの数")
+    parser.add_argument("--rate", type=float, default=0, help="1秒あたりの発言数（0で一気に流す）")
+    parser.add_argument("--unique", action="store_true", help="質問を毎回変えてキャッシュを効かせない")
+    parser.add_argument("--latency", type=float, default=0.2, help="canned: 応答までの秒数")
+    parser.add_argument("--chunk-delay", type=float, default=0.05, help="canned: チャンクの間隔（秒）")
+    parser.add_argument("--post-latency", type=float, default=0.05, help="Webhook投稿・編集にかかる秒数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # 設定は cog の読み込み前に環境変数で渡す（未設定のものだけ）
+    os.environ["AI_BACKEND"] = args.backend
+    os.environ["AI_STUB_URL"] = args.stub_url
+    defaults = {
+        "AI_TARGET_CHANNEL_ID": "1",
+        "USER_MAX_LENGTH": "200",
+        "GEMINI_MAX_LENGTH": "300",
+        "AI_STREAM_EDIT_INTERVAL": "0.2",
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+    # data_public は本物を使い、DBなどの書き込みは一時ディレクトリへ
+    workdir = tempfile.mkdtemp(prefix="ai-bench-")
+    os.symlink(os.path.join(ROOT, "data_public"), os.path.join(workdir, "data_public"))
+    sys.path.insert(0, ROOT)
+    os.chdir(workdir)
+    try:
+        asyncio.run(run(args))
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Gemini API のローカルスタブ（ネットワークなしで gozaru-ai を動かす・計測する用）
+
+    python tools/gemini_stub.py --port 8089
+    GEMINI_API_BASE=http://127.0.0.1:8089 python bot.py
+
+generateContent と streamGenerateContent（alt=sse）に、プロンプトの「ユーザー:」行を
+使った決まった文章で応答する。
+"""
+import argparse
+import asyncio
+import json
+
+from aiohttp import web
+
+DEFAULT_REPLY = "それについては風真もよく分からないでござるが、調べてみるでござる！"
+
+
+def build_reply(prompt: str, length: int) -> str:
+    question = ""
+    for line in prompt.splitlines():
+        line = line.strip()
+        if line.startswith("ユーザー:"):
+            question = line[len("ユーザー:"):].strip()
+    text = f"「{question}」でござるな。{DEFAULT_REPLY}" if question else DEFAULT_REPLY
+    while len(text) < length:
+        text += DEFAULT_REPLY
+    return text[:length]
+
+
+def response_body(text: str, prompt: str, finished: bool) -> dict:
+    body = {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "finishReason": "STOP" if finished else None,
+        }],
+    }
+    if finished:
+        body["usageMetadata"] = {
+            "promptTokenCount": len(prompt) // 2,
+            "candidatesTokenCount": len(text) // 2,
+        }
+    return body
+
+
+def make_app(args) -> web.Application:
+    async def handle(request: web.Request):
+        model, _, method = request.match_info["target"].partition(":")
+        data = await request.json()
+        prompt = "".join(p.get("text", "") for c in data.get("contents", []) for p in c.get("parts", []))
+        reply = build_reply(prompt, args.length)
+
+        await asyncio.sleep(args.latency)
+
+        if method == "generateContent":
+            return web.json_response(response_body(reply, prompt, True))
+        if method != "streamGenerateContent":
+            return web.json_response({"error": {"message": f"unknown method {method}"}}, status=404)
+
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        chunks = [reply[i:i + args.chunk_size] for i in range(0, len(reply), args.chunk_size)]
+        for i, chunk in enumerate(chunks):
+            body = response_body(chunk, prompt, i == len(chunks) - 1)
+            await resp.write(f"data: {json.dumps(body, ensure_ascii=False)}\r\n\r\n".encode("utf-8"))
+            await asyncio.sleep(args.chunk_delay)
+        await resp.write_eof()
+        return resp
+
+    app = web.Application()
+    app.router.add_post("/v1/models/{target}", handle)
+    app.router.add_post("/v1beta/models/{target}", handle)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini API のローカルスタブ")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.3, help="最初の応答までの秒数")
+    parser.add_argument("--chunk-size", type=int, default=20, help="ストリーミング1回あたりの文字数")
+    parser.add_argument("--chunk-delay", type=float, default=0.2, help="チャンクの間隔（秒）")
+    parser.add_argument("--length", type=int, default=150, help="応答の文字数")
+    args = parser.parse_args()
+
+    web.run_app(make_app(args), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import asyncio
+import time
+import traceback
+
+from utils.perf import LatencyStats
+
+# submit() の結果
+ACCEPTED = "accepted"
+BUSY = "busy"                  # 待ち行列がいっぱい
+RATE_LIMITED = "rate_limited"  # その人の送りすぎ
+DISABLED = "disabled"          # AI停止中
+
+
+class UserBucket:
+    """ユーザーごとのトークンバケット（最大 burst 回、refill 秒ごとに1回分回復）"""
+
+    def __init__(self, burst: int, refill: float):
+        self.burst = burst
+        self.refill = refill
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) / self.refill)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def full(self) -> bool:
+        return self.tokens + (time.monotonic() - self.updated) / self.refill >= self.burst
+
+
+# =====================
+# AIリクエストの待ち行列
+# =====================
+class AIRequestQueue:
+    """
+    上限付きの待ち行列と固定数のワーカーで handler(item) を実行する
+    - 同時に実行するのは concurrency 件まで、待てるのは maxsize 件まで（超えたら BUSY）
+    - ユーザーごとのトークンバケットで連投を抑える（RATE_LIMITED）
+    - enabled() が False のあいだは受け付けず、待っていた分も実行せずに捨てる
+    """
+
+    def __init__(self, handler, *, concurrency: int, maxsize: int, user_burst: int, user_refill: float, enabled=lambda: True):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.enabled = enabled
+        self.user_burst = user_burst
+        self.user_refill = user_refill
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.buckets: dict[int, UserBucket] = {}
+        self.running = 0
+        self._workers: list[asyncio.Task] = []
+
+        self.metrics = {
+            ACCEPTED: 0, BUSY: 0, RATE_LIMITED: 0, DISABLED: 0,
+            "dropped": 0, "completed": 0, "failed": 0, "max_depth": 0,
+        }
+        self.wait_time = LatencyStats()  # 受付から実行開始まで
+        self.run_time = LatencyStats()   # handler の実行時間
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, user_id: int, item) -> str:
+        if not self.enabled():
+            result = DISABLED
+        elif self.queue.full():
+            # 混雑で断った分はその人の回数に数えない
+            result = BUSY
+        elif not self._bucket(user_id).try_acquire():
+            result = RATE_LIMITED
+        else:
+            self.queue.put_nowait((time.monotonic(), item))
+            result = ACCEPTED
+            self.metrics["max_depth"] = max(self.metrics["max_depth"], self.queue.qsize())
+        self.metrics[result] += 1
+        return result
+
+    def _bucket(self, user_id: int) -> UserBucket:
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            # 満タンに戻ったバケットは捨ててよいので、ここでついでに掃除する
+            if len(self.buckets) > 1000:
+                self.buckets = {uid: b for uid, b in self.buckets.items() if not b.full()}
+            bucket = self.buckets[user_id] = UserBucket(self.user_burst, self.user_refill)
+        return bucket
+
+    async def _worker(self):
+        while True:
+            queued_at, item = await self.queue.get()
+            try:
+                # 待っているあいだに停止された分は実行しない
+                if not self.enabled():
+                    self.metrics["dropped"] += 1
+                    continue
+
+                self.wait_time.record(time.monotonic() - queued_at)
+                self.running += 1
+                start = time.perf_counter()
+                failed = False
+                try:
+                    await self.handler(item)
+                except Exception:
+                    failed = True
+                    print("❌ AIリクエストの処理でエラー")
+                    traceback.print_exc()
+                finally:
+                    self.running -= 1
+                    self.run_time.record(time.perf_counter() - start, failed)
+                    self.metrics["failed" if failed else "completed"] += 1
+            finally:
+                self.queue.task_done()
+
+    def summary(self) -> dict:
+        return {
+            "depth": self.queue.qsize(),
+            "maxsize": self.queue.maxsize,
+            "running": self.running,
+            "concurrency": self.concurrency,
+            **self.metrics,
+            "wait": self.wait_time.summary(),
+            "run": self.run_time.summary(),
+        }
@@ -0,0 +1,102 @@
+import json
+import os
+from collections import deque
+
+
+# =====================
+# 名前・呼び方の一括照合（Aho–Corasick）
+# =====================
+class AliasMatcher:
+    """
+    {正式名: [呼び方, ...]} から作るオートマトン。
+    文章を1回なめるだけで、含まれる名前のうち一番長いもの（同じ長さなら先に出たもの）を返す
+    """
+
+    def __init__(self, members: dict[str, list[str]]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # そのノードで終わる一番長い名前 (長さ, 正式名)
+        self._out: list[tuple[int, str] | None] = [None]
+
+        for official, aliases in members.items():
+            for pattern in (official, *aliases):
+                if pattern:
+                    self._add(pattern, official)
+        self._build()
+
+    def _add(self, pattern: str, official: str):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(None)
+            node = nxt
+        # 同じ文字列が複数のメンバーにある場合はファイルで先に書かれた方
+        if self._out[node] is None:
+            self._out[node] = (len(pattern), official)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                fallback = self._goto[f].get(ch, 0)
+                self._fail[child] = fallback if fallback != child else 0
+                # 自分で終わる名前がなければ、接尾辞で終わる一番長い名前を引き継ぐ
+                if self._out[child] is None:
+                    self._out[child] = self._out[self._fail[child]]
+
+    def find(self, text: str) -> str | None:
+        best = None  # (長さ, -開始位置, 正式名)
+        node = 0
+        goto, fail, out = self._goto, self._fail, self._out
+
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+
+            hit = out[node]
+            if hit is not None:
+                length, official = hit
+                candidate = (length, length - i - 1, official)
+                if best is None or candidate[:2] > best[:2]:
+                    best = candidate
+
+        return best[2] if best else None
+
+
+# =====================
+# ファイルから読み込み（更新されたら作り直す）
+# =====================
+class MemberResolver:
+    """holomembers.json の AliasMatcher を保持し、ファイルが更新されたときだけ作り直す"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        self._matcher = AliasMatcher({})
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            self._matcher = AliasMatcher(json.load(f))
+        self._mtime = mtime
+
+    def resolve(self, text: str) -> str | None:
+        self._refresh()
+        return self._matcher.find(text)
@@ -0,0 +1,77 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+# =====================
+# LRUキャッシュ
+# =====================
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return None
+        return self._data[key]
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+# =====================
+# 期限付きLRUキャッシュ
+# =====================
+class TTLCache(LRUCache):
+    """登録から ttl 秒たった値は無いものとして扱う"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize)
+        self.ttl = ttl
+
+    def get(self, key):
+        entry = super().get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def put(self, key, value):
+        super().put(key, (time.monotonic() + self.ttl, value))
+
+
+# =====================
+# 同時に来た同じ処理をまとめる
+# =====================
+class SingleFlight:
+    """同じキーの処理が実行中なら、新しく始めずにその結果を待つ"""
+
+    def __init__(self):
+        self._tasks: dict = {}
+        self.coalesced = 0
+
+    def __contains__(self, key):
+        return key in self._tasks
+
+    async def run(self, key, factory):
+        """factory() はコルーチンを返す関数"""
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.create_task(factory())
+            task.add_done_callback(lambda t: self._tasks.pop(key) if self._tasks.get(key) is t else None)
+        else:
+            self.coalesced += 1
+        # 待っている1人がキャンセルされても処理自体は止めない
+        return await asyncio.shield(task)
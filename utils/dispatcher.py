@@ -0,0 +1,130 @@
+import asyncio
+import time
+import traceback
+
+import discord
+
+from utils.perf import LatencyStats
+
+
+# =====================
+# 登録された受け口
+# =====================
+class Route:
+    """dispatcher に登録された on_message ハンドラ1つ分"""
+
+    def __init__(self, handler, name: str, channels=None, content=None, role_mentions=None, guild_only=False):
+        self.handler = handler
+        self.name = name
+        self.channels = frozenset(channels) if channels is not None else None
+        self.content = content
+        self.role_mentions = frozenset(role_mentions) if role_mentions is not None else None
+        self.guild_only = guild_only
+
+        # 実行時間の統計
+        self.stats = LatencyStats()
+
+    def matches(self, message: discord.Message) -> bool:
+        if self.guild_only and message.guild is None:
+            return False
+        if self.channels is not None and message.channel.id not in self.channels:
+            return False
+        if self.content is not None and message.content != self.content:
+            return False
+        if self.role_mentions is not None:
+            if not any(role.id in self.role_mentions for role in message.role_mentions):
+                return False
+        return True
+
+
+# =====================
+# on_message の一括振り分け
+# =====================
+class MessageDispatcher:
+    """on_message を1か所で受け、関係するハンドラだけを起こす（MyBot.dispatcher）"""
+
+    def __init__(self):
+        self.routes: list[Route] = []
+        self._tasks: set[asyncio.Task] = set()
+        self._rebuild()
+
+    def register(self, handler, *, name=None, channels=None, content=None, role_mentions=None, guild_only=False) -> Route:
+        """
+        handler(message) を登録する。条件はすべて AND。
+        channels: チャンネルIDの集合 / content: 完全一致する本文 / role_mentions: メンションされたロールIDの集合
+        """
+        route = Route(
+            handler,
+            name or getattr(handler, "__qualname__", repr(handler)),
+            channels=channels,
+            content=content,
+            role_mentions=role_mentions,
+            guild_only=guild_only
+        )
+        self.routes.append(route)
+        self._rebuild()
+        return route
+
+    def unregister(self, route: Route):
+        if route in self.routes:
+            self.routes.remove(route)
+            self._rebuild()
+
+    def set_channels(self, route: Route, channels):
+        """登録済みハンドラの対象チャンネルを差し替える"""
+        route.channels = frozenset(channels)
+        self._rebuild()
+
+    def _rebuild(self):
+        # 各ハンドラは最も絞り込める条件1つで索引に入れ、残りは matches() で確認する
+        self._by_channel: dict[int, list[Route]] = {}
+        self._by_content: dict[str, list[Route]] = {}
+        self._by_role: dict[int, list[Route]] = {}
+        self._always: list[Route] = []
+
+        for route in self.routes:
+            if route.channels is not None:
+                for channel_id in route.channels:
+                    self._by_channel.setdefault(channel_id, []).append(route)
+            elif route.content is not None:
+                self._by_content.setdefault(route.content, []).append(route)
+            elif route.role_mentions is not None:
+                for role_id in route.role_mentions:
+                    self._by_role.setdefault(role_id, []).append(route)
+            else:
+                self._always.append(route)
+
+    def candidates(self, message: discord.Message) -> list[Route]:
+        routes = list(self._always)
+        routes += self._by_channel.get(message.channel.id, ())
+        routes += self._by_content.get(message.content, ())
+        if self._by_role:
+            for role in message.role_mentions:
+                for route in self._by_role.get(role.id, ()):
+                    if route not in routes:
+                        routes.append(route)
+        return routes
+
+    async def dispatch(self, message: discord.Message):
+        # Botの発言はどのハンドラも扱わない
+        if message.author.bot:
+            return
+
+        for route in self.candidates(message):
+            if route.matches(message):
+                # 1つのハンドラが遅くても他を待たせないよう個別のタスクで実行
+                task = asyncio.create_task(self._run(route, message))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, route: Route, message: discord.Message):
+        start = time.perf_counter()
+        failed = False
+        try:
+            await route.handler(message)
+        except Exception:
+            failed = True
+            print(f"❌ on_message ハンドラでエラー: {route.name}")
+            traceback.print_exc()
+        finally:
+            route.stats.record(time.perf_counter() - start, failed)
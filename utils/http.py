@@ -0,0 +1,22 @@
+import aiohttp
+
+# =====================
+# 設定
+# =====================
+HTTP_LIMIT = 100            # 全体の同時接続数
+HTTP_LIMIT_PER_HOST = 10    # 同じホストへの同時接続数
+DNS_CACHE_TTL = 300         # DNSの結果を使い回す秒数
+KEEPALIVE_TIMEOUT = 60      # 使っていない接続を残しておく秒数
+
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=10)
+
+
+def create_http_session() -> aiohttp.ClientSession:
+    """Bot全体で共有する HTTP セッション（MyBot.http_session）。イベントループ上で作る"""
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_LIMIT,
+        limit_per_host=HTTP_LIMIT_PER_HOST,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=REQUEST_TIMEOUT)
@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import json
+from abc import ABC, abstractmethod
+
+import aiohttp
+
+# =====================
+# 設定
+# =====================
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com"
+GEMINI_MODEL = "gemini-2.5-flash-lite"
+STUB_API_BASE = "http://127.0.0.1:8089"  # tools/gemini_stub.py の既定
+
+# ストリーミングは全体の時間ではなく、チャンクの間隔で打ち切る
+STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+
+# 通信の失敗と、応答が読めない・形が違う（ブロックされて候補がない等）場合は BackendError にする
+RESPONSE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError, IndexError, TypeError)
+
+CANNED_REPLIES = [
+    "それは風真も気になってたでござる！また一緒に調べてみるでござるよ。",
+    "うーん、風真にはちょっと分からないでござる…ごめんでござる！",
+    "いい質問でござるな！風真の知ってる範囲で答えるでござる。",
+]
+
+
+class BackendError(Exception):
+    """応答が得られなかった（ステータス異常・通信エラー・読めない応答）"""
+
+
+# =====================
+# バックエンド共通
+# =====================
+class LLMBackend(ABC):
+    """
+    generate(prompt) -> (文章, usage) と、stream(prompt) で (文章の続き, usage) を順に返す。
+    usage は Gemini の usageMetadata 形式（無ければ None）
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def generate(self, prompt: str, max_tokens: int) -> tuple[str, dict | None]:
+        ...
+
+    async def stream(self, prompt: str, max_tokens: int):
+        text, usage = await self.generate(prompt, max_tokens)
+        yield text, usage
+
+
+# =====================
+# Gemini（と同じ形式のスタブ）
+# =====================
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, session: aiohttp.ClientSession, api_key: str, base: str = GEMINI_API_BASE, model: str = GEMINI_MODEL):
+        self.session = session
+        self.api_key = api_key or ""
+        self.base = base.rstrip("/")
+        self.model = model
+
+    def _payload(self, prompt: str, max_tokens: int) -> dict:
+        return {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {"maxOutputTokens": max_tokens}
+        }
+
+    async def generate(self, prompt: str, max_tokens: int) -> tuple[str, dict | None]:
+        url = f"{self.base}/v1/models/{self.model}:generateContent"
+
+        try:
+            async with self.session.post(
+                url,
+                params={"key": self.api_key},
+                json=self._payload(prompt, max_tokens)
+            ) as resp:
+
+                text = await resp.text()
+                if resp.status != 200:
+                    raise BackendError(f"status {resp.status}")
+
+                data = json.loads(text)
+                return data["candidates"][0]["content"]["parts"][0]["text"], data.get("usageMetadata")
+        except RESPONSE_ERRORS as e:
+            raise BackendError(f"{type(e).__name__}: {e}") from e
+
+    async def stream(self, prompt: str, max_tokens: int):
+        """streamGenerateContent（SSE）で届いた分から返す"""
+        url = f"{self.base}/v1/models/{self.model}:streamGenerateContent"
+
+        try:
+            async with self.session.post(
+                url,
+                params={"key": self.api_key, "alt": "sse"},
+                json=self._payload(prompt, max_tokens),
+                timeout=STREAM_TIMEOUT
+            ) as resp:
+
+                if resp.status != 200:
+                    raise BackendError(f"status {resp.status}")
+
+                async for raw in resp.content:
+                    line = raw.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = json.loads(line[5:])
+                    text = "".join(
+                        part.get("text", "")
+                        for candidate in data.get("candidates", [])[:1]
+                        for part in candidate.get("content", {}).get("parts", [])
+                    )
+                    # トークン数は最後のチャンクに付いてくる
+                    usage = data.get("usageMetadata")
+                    if text or usage:
+                        yield text, usage
+        except RESPONSE_ERRORS as e:
+            raise BackendError(f"{type(e).__name__}: {e}") from e
+
+
+class StubBackend(GeminiBackend):
+    """tools/gemini_stub.py など、Gemini と同じ形式で答えるローカルサーバー"""
+
+    name = "stub"
+
+    def __init__(self, session: aiohttp.ClientSession, base: str = STUB_API_BASE):
+        super().__init__(session, "stub", base=base)
+
+
+# =====================
+# 決まった文章を返す（通信なし）
+# =====================
+class CannedBackend(LLMBackend):
+    """プロンプトから決まる定型文を返す。latency で応答までの時間、chunk_size/chunk_delay で分割を真似る"""
+
+    name = "canned"
+
+    def __init__(self, latency: float = 0.0, chunk_size: int = 20, chunk_delay: float = 0.0):
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+
+    def _reply(self, prompt: str, max_tokens: int) -> tuple[str, dict]:
+        digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=4).digest()
+        text = CANNED_REPLIES[int.from_bytes(digest, "big") % len(CANNED_REPLIES)][:max_tokens]
+        usage = {"promptTokenCount": len(prompt) // 2, "candidatesTokenCount": len(text) // 2}
+        return text, usage
+
+    async def generate(self, prompt: str, max_tokens: int) -> tuple[str, dict | None]:
+        await asyncio.sleep(self.latency)
+        return self._reply(prompt, max_tokens)
+
+    async def stream(self, prompt: str, max_tokens: int):
+        await asyncio.sleep(self.latency)
+        text, usage = self._reply(prompt, max_tokens)
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(self.chunk_delay)
+            yield chunk, usage if i == len(chunks) - 1 else None
+
+
+def create_backend(name: str, session: aiohttp.ClientSession, *, api_key: str = None, api_base: str = None, stub_base: str = None) -> LLMBackend:
+    """AI_BACKEND の値（gemini / stub / canned）からバックエンドを作る"""
+    if name == "gemini":
+        return GeminiBackend(session, api_key, base=api_base or GEMINI_API_BASE)
+    if name == "stub":
+        return StubBackend(session, base=stub_base or STUB_API_BASE)
+    if name == "canned":
+        return CannedBackend()
+    raise ValueError(f"不明な AI_BACKEND: {name}")
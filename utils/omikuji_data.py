@@ -0,0 +1,278 @@
+import asyncio
+import copy
+import json
+import os
+import random
+from datetime import datetime
+from itertools import accumulate
+
+# =====================
+# パス設定
+# =====================
+DB_PATH = "data/omikuji/omikuji.db"
+LEGACY_DATA_FILE = "data/omikuji/omikuji.json"  # 旧形式（初回起動時に取り込む）
+CONTROL_FILE = "data/omikuji/omikuji_control.json"
+
+RESULTS = ["ござ吉", "大吉", "中吉", "小吉", "吉", "末吉", "凶", "大凶", "大厄日"]
+
+
+def _read_legacy_data():
+    with open(LEGACY_DATA_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _retire_legacy_data():
+    # 取り込み済みのJSONは再取り込みされないよう退避する
+    os.replace(LEGACY_DATA_FILE, LEGACY_DATA_FILE + ".bak")
+
+
+def _import_users(conn, rows):
+    conn.executemany(
+        "INSERT OR IGNORE INTO omikuji_users (user_id, last_date, count) VALUES (?, ?, ?)",
+        rows
+    )
+
+
+# =====================
+# ユーザーごとの参拝記録
+# =====================
+class OmikujiStore:
+    """ユーザー単位の参拝記録（メモリキャッシュ＋SQLiteへの書き込み）"""
+
+    def __init__(self, db):
+        self.db = db
+        self.users: dict[str, dict] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    async def load(self):
+        """テーブル作成と全件読み込み（何度呼んでも1回だけ実行）"""
+        async with self._load_lock:
+            if self._loaded:
+                return
+
+            await self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS omikuji_users (
+                user_id TEXT PRIMARY KEY,
+                last_date TEXT NOT NULL,
+                count INTEGER NOT NULL
+            )
+            """)
+            rows = await self.db.fetchall("SELECT user_id, last_date, count FROM omikuji_users")
+
+            # 旧JSONからの移行
+            if not rows and os.path.exists(LEGACY_DATA_FILE):
+                loop = asyncio.get_running_loop()
+                legacy = await loop.run_in_executor(None, _read_legacy_data)
+                rows = [(uid, v["last_date"], v["count"]) for uid, v in legacy.items()]
+                await self.db.transaction(_import_users, rows)
+                await loop.run_in_executor(None, _retire_legacy_data)
+                print(f"✅ omikuji.json から {len(rows)} 件を移行しました")
+
+            self.users = {uid: {"last_date": last_date, "count": count} for uid, last_date, count in rows}
+            self._loaded = True
+
+    def lock(self, user_id: str) -> asyncio.Lock:
+        """ユーザーごとのロック（同じ人の同時実行を防ぐ）"""
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    def get(self, user_id: str):
+        record = self.users.get(user_id)
+        return dict(record) if record else None
+
+    async def put(self, user_id: str, last_date: str, count: int):
+        await self.db.execute(
+            "INSERT INTO omikuji_users (user_id, last_date, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET last_date = excluded.last_date, count = excluded.count",
+            (user_id, last_date, count)
+        )
+        self.users[user_id] = {"last_date": last_date, "count": count}
+
+    async def delete(self, user_id: str):
+        await self.db.execute("DELETE FROM omikuji_users WHERE user_id = ?", (user_id,))
+        self.users.pop(user_id, None)
+
+    def drawn_on(self, day: str) -> list[str]:
+        return [uid for uid, v in self.users.items() if v["last_date"] == day]
+
+
+def get_omikuji_store(bot) -> OmikujiStore:
+    """Bot全体で1つの OmikujiStore を共有する"""
+    if not hasattr(bot, "omikuji_store"):
+        bot.omikuji_store = OmikujiStore(bot.storage.get(DB_PATH))
+    return bot.omikuji_store
+
+
+# =====================
+# おみくじ設定（テスター・確率）
+# =====================
+def default_control():
+    return {
+        "tester": [],
+        "probability": {
+            "mode": "normal",   # normal / custom / preset
+            "weights": {r: 1 for r in RESULTS},
+            "presets": {},
+            "active_preset": None
+        }
+    }
+
+
+def _read_control():
+    if not os.path.exists(CONTROL_FILE):
+        return default_control()
+    with open(CONTROL_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_control(data):
+    # 書きかけのファイルを読まれないよう一時ファイルから置き換える
+    tmp = CONTROL_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp, CONTROL_FILE)
+
+
+class OmikujiControl:
+    """設定をメモリに保持し、抽選用の累積重みを前計算しておく"""
+
+    def __init__(self):
+        self._apply(_read_control())
+
+    def _apply(self, data):
+        data.setdefault("tester", [])
+        prob = data.setdefault("probability", {})
+        prob.setdefault("mode", "normal")
+        prob.setdefault("weights", {r: 1 for r in RESULTS})
+        prob.setdefault("presets", {})
+        prob.setdefault("active_preset", None)
+
+        self.data = data
+        self.testers = set(data["tester"])
+
+        # 通常モード → 完全ランダム / それ以外は累積重みで抽選
+        self.cum_weights = None
+        if prob["mode"] != "normal":
+            cum_weights = list(accumulate(prob["weights"].get(r, 1) for r in RESULTS))
+            if cum_weights[-1] > 0:
+                self.cum_weights = cum_weights
+
+    def snapshot(self) -> dict:
+        """編集用のコピー（save() に渡して反映する）"""
+        return copy.deepcopy(self.data)
+
+    async def save(self, data):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _write_control, data)
+        self._apply(data)
+
+    def is_tester(self, user_id: str) -> bool:
+        return user_id in self.testers
+
+    def draw(self) -> str:
+        if self.cum_weights is None:
+            return random.choice(RESULTS)
+        return random.choices(RESULTS, cum_weights=self.cum_weights, k=1)[0]
+
+
+def get_omikuji_control(bot) -> OmikujiControl:
+    """Bot全体で1つの OmikujiControl を共有する"""
+    if not hasattr(bot, "omikuji_control"):
+        bot.omikuji_control = OmikujiControl()
+    return bot.omikuji_control
+
+
+# =====================
+# 統計（集計済みカウンタ）
+# =====================
+STATS_DB_PATH = "data/omikuji/omikuji_stats.db"
+
+
+def _backfill_stats(conn):
+    # 集計テーブル導入前の履歴から一度だけ作る
+    if conn.execute("SELECT 1 FROM stats_total LIMIT 1").fetchone():
+        return
+    conn.execute(
+        "INSERT INTO stats_total (result, count) "
+        "SELECT result, COUNT(*) FROM stats GROUP BY result"
+    )
+    conn.execute(
+        "INSERT INTO stats_daily (day, result, count) "
+        "SELECT date(timestamp, 'localtime'), result, COUNT(*) FROM stats "
+        "GROUP BY date(timestamp, 'localtime'), result"
+    )
+
+
+def _record_result(conn, result, day):
+    conn.execute("INSERT INTO stats (result) VALUES (?)", (result,))
+    conn.execute(
+        "INSERT INTO stats_total (result, count) VALUES (?, 1) "
+        "ON CONFLICT(result) DO UPDATE SET count = count + 1",
+        (result,)
+    )
+    conn.execute(
+        "INSERT INTO stats_daily (day, result, count) VALUES (?, ?, 1) "
+        "ON CONFLICT(day, result) DO UPDATE SET count = count + 1",
+        (day, result)
+    )
+
+
+class OmikujiStats:
+    """結果ごとの累計・日別カウンタ（記録と同じトランザクションで更新）"""
+
+    def __init__(self, db):
+        self.db = db
+        # 記録のたびに増える（グラフのキャッシュ判定用）
+        self.version = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    async def load(self):
+        async with self._load_lock:
+            if self._loaded:
+                return
+
+            await self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS stats (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                result TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE TABLE IF NOT EXISTS stats_total (
+                result TEXT PRIMARY KEY,
+                count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS stats_daily (
+                day TEXT,
+                result TEXT,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (day, result)
+            ) WITHOUT ROWID;
+            """)
+            await self.db.transaction(_backfill_stats)
+            self._loaded = True
+
+    async def record(self, result: str):
+        day = datetime.now().strftime("%Y-%m-%d")
+        await self.db.transaction(_record_result, result, day)
+        self.version += 1
+
+    async def fetch(self, since: str | None = None) -> list[tuple[str, int]]:
+        """(結果, 回数) の一覧。since（YYYY-MM-DD）以降に絞り込める"""
+        if since is None:
+            return await self.db.fetchall("SELECT result, count FROM stats_total")
+        return await self.db.fetchall(
+            "SELECT result, SUM(count) FROM stats_daily WHERE day >= ? GROUP BY result",
+            (since,)
+        )
+
+
+def get_omikuji_stats(bot) -> OmikujiStats:
+    """Bot全体で1つの OmikujiStats を共有する"""
+    if not hasattr(bot, "omikuji_stats"):
+        bot.omikuji_stats = OmikujiStats(bot.storage.get(STATS_DB_PATH))
+    return bot.omikuji_stats
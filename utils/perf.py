@@ -0,0 +1,325 @@
+import asyncio
+import json
+import math
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+
+# =====================
+# 設定
+# =====================
+SAMPLE_SIZE = 1024          # パーセンタイル計算に使う直近の件数
+LAG_INTERVAL = 0.5          # イベントループ遅延の計測間隔（秒）
+DUMP_INTERVAL = 300         # 統計ファイルの書き出し間隔（秒）
+DUMP_PATH = "data/perf_stats.json"
+
+WATCHDOG_STACK_DEPTH = 8    # 記録するスタックの段数
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# =====================
+# 実行時間の統計
+# =====================
+class LatencyStats:
+    """呼び出し回数・エラー数と、直近 SAMPLE_SIZE 件の実行時間"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+    def record(self, elapsed: float, failed: bool = False):
+        self.calls += 1
+        self.errors += failed
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.samples.append(elapsed)
+
+    def percentiles(self, *points) -> list[float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return [0.0 for _ in points]
+        return [ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points]
+
+    def summary(self) -> dict:
+        p50, p95, p99 = self.percentiles(50, 95, 99)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.total / self.calls * 1000, 2) if self.calls else 0.0,
+            "p50_ms": round(p50 * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2),
+            "p99_ms": round(p99 * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+
+# =====================
+# リスナーの計測ラッパー
+# =====================
+class TimedListener:
+    """Bot.extra_events に入っているリスナーを包んで実行時間を記録する"""
+
+    def __init__(self, func, stats: LatencyStats):
+        self.func = func
+        self.stats = stats
+        self.__name__ = func.__name__
+
+    async def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        failed = False
+        try:
+            return await self.func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.stats.record(time.perf_counter() - start, failed)
+
+    # remove_listener() が元のメソッドで探しても見つかるようにする
+    def __eq__(self, other):
+        if isinstance(other, TimedListener):
+            return self.func == other.func
+        return self.func == other
+
+    def __hash__(self):
+        return hash(self.func)
+
+
+def listener_name(event: str, func) -> str:
+    owner = getattr(func, "__self__", None)
+    prefix = type(owner).__name__ + "." if owner is not None else ""
+    return f"{event}:{prefix}{func.__name__}"
+
+
+# =====================
+# イベントループの停止検出
+# =====================
+class BlockSite:
+    """ループを止めた呼び出し箇所1つ分の集計"""
+
+    def __init__(self, stack: list[str]):
+        self.stack = stack
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, blocked: float):
+        self.count += 1
+        self.total += blocked
+        self.max = max(self.max, blocked)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+            "stack": self.stack,
+        }
+
+
+def _in_project(filename: str) -> bool:
+    path = os.path.abspath(filename)
+    return (
+        path.startswith(PROJECT_ROOT + os.sep)
+        and "site-packages" not in path
+        and path != os.path.abspath(__file__)
+    )
+
+
+def block_site(stack: traceback.StackSummary) -> tuple[str, list[str]]:
+    """スタックから (集計キー, 表示用スタック) を作る。キーはプロジェクト内で一番内側の呼び出し行"""
+    own = [f for f in stack if _in_project(f.filename)]
+    caller = own[-1] if own else stack[-1]
+    key = f"{os.path.relpath(caller.filename, PROJECT_ROOT)}:{caller.lineno} {caller.name}"
+
+    lines = [
+        f"{os.path.relpath(f.filename, PROJECT_ROOT) if _in_project(f.filename) else f.filename}:{f.lineno} {f.name}"
+        for f in stack[-WATCHDOG_STACK_DEPTH:]
+    ]
+    return key, lines
+
+
+class LoopWatchdog:
+    """
+    イベントループからの心拍が threshold 秒以上途絶えたら、別スレッドから
+    ループのスレッドのスタックを取って呼び出し箇所ごとに集計する
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.interval = threshold / 4
+        self.sites: dict[str, BlockSite] = {}
+        self.stalls = 0
+
+        self._heartbeat = time.monotonic()
+        self._captured = None    # スタックを取った心拍（1回の停止で1度だけ取る）
+        self._pending = None     # (心拍, BlockSite) 停止が終わったら時間を記録する
+        self._loop_thread = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._task = None
+
+    def start(self):
+        """イベントループ上で呼ぶ"""
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+
+    async def _beat(self):
+        while True:
+            beat = self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            pending = self._pending
+            if pending is not None and pending[0] == beat:
+                self._pending = None
+                pending[1].record(time.monotonic() - beat - self.interval)
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            beat = self._heartbeat
+            if beat == self._captured or time.monotonic() - beat - self.interval < self.threshold:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            key, lines = block_site(traceback.extract_stack(frame))
+            del frame
+
+            site = self.sites.get(key)
+            if site is None:
+                site = self.sites[key] = BlockSite(lines)
+            self.stalls += 1
+            self._captured = beat
+            self._pending = (beat, site)
+
+    def report(self) -> dict:
+        sites = sorted(self.sites.items(), key=lambda item: item[1].total, reverse=True)
+        return {
+            "threshold_ms": round(self.threshold * 1000, 2),
+            "stalls": self.stalls,
+            "sites": {key: site.summary() for key, site in sites},
+        }
+
+
+# =====================
+# Bot全体の計測
+# =====================
+class Instrumentation:
+    """全リスナー・コマンドの実行時間とイベントループ遅延を記録する（MyBot.instrumentation）"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.stats: dict[str, LatencyStats] = {}
+        self.loop_lag = LatencyStats()
+        self.installed = False
+        self.watchdog: LoopWatchdog | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    def get(self, name: str) -> LatencyStats:
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = LatencyStats()
+        return stats
+
+    def start_watchdog(self, threshold: float):
+        """イベントループの停止検出を有効にする（LOOP_WATCHDOG=1 のとき bot.py から）"""
+        if self.watchdog is None:
+            self.watchdog = LoopWatchdog(threshold)
+            self.watchdog.start()
+
+    def install(self):
+        """setup_hook でCogを読み込んだ後に呼ぶ"""
+        self.bot.before_invoke(self._before_invoke)
+        self.bot.after_invoke(self._after_invoke)
+        self.wrap_listeners()
+        self._tasks = [
+            asyncio.create_task(self._monitor_loop_lag()),
+            asyncio.create_task(self._dump_periodically()),
+        ]
+        self.installed = True
+
+    def wrap_listeners(self):
+        """まだ包んでいないリスナーをすべて計測対象にする（Cogの再読み込み後も呼ぶ）"""
+        for event, funcs in self.bot.extra_events.items():
+            for i, func in enumerate(funcs):
+                if not isinstance(func, TimedListener):
+                    funcs[i] = TimedListener(func, self.get(listener_name(event, func)))
+
+    # ---- コマンド ----
+    async def _before_invoke(self, ctx):
+        ctx._perf_start = time.perf_counter()
+
+    async def _after_invoke(self, ctx):
+        start = getattr(ctx, "_perf_start", None)
+        if start is None or ctx.command is None:
+            return
+        self.get(f"command:{ctx.command.qualified_name}").record(
+            time.perf_counter() - start, ctx.command_failed
+        )
+
+    # ---- イベントループ遅延 ----
+    async def _monitor_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.loop_lag.record(max(0.0, loop.time() - start - LAG_INTERVAL))
+
+    # ---- 集計・書き出し ----
+    def report(self) -> dict:
+        handlers = {name: stats.summary() for name, stats in self.stats.items()}
+        dispatcher = getattr(self.bot, "dispatcher", None)
+        if dispatcher is not None:
+            for route in dispatcher.routes:
+                handlers[f"dispatch:{route.name}"] = route.stats.summary()
+
+        latency = self.bot.latency
+        return {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "gateway_latency_ms": None if math.isnan(latency) else round(latency * 1000, 2),
+            "loop_lag": self.loop_lag.summary(),
+            "handlers": handlers,
+            "blocking": self.watchdog.report() if self.watchdog else None,
+        }
+
+    def _write(self, report: dict):
+        os.makedirs(os.path.dirname(DUMP_PATH), exist_ok=True)
+        tmp = DUMP_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, DUMP_PATH)
+
+    async def dump(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write, self.report())
+
+    async def _dump_periodically(self):
+        while True:
+            await asyncio.sleep(DUMP_INTERVAL)
+            try:
+                await self.dump()
+            except Exception as e:
+                print("❌ 計測結果の書き出し失敗:", e)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        if self.watchdog:
+            self.watchdog.stop()
+        if self.installed:
+            await self.dump()
@@ -0,0 +1,107 @@
+import os
+
+# =====================
+# テンプレート
+# =====================
+# 人物が特定できなかったとき
+UNKNOWN_BODY = """
+    質問文に含まれる名前は、公式に確認できないでござる。
+    JSONに存在する情報のみを元に、
+    「分からないことは分からない」と優しく伝えてください。
+"""
+
+# 人物が特定できたとき（{name} に正式名）
+KNOWN_BODY = """
+    質問に含まれる人物は
+    「{name}」でござる。
+
+    JSONで確認できた正式名と一般的な呼び方を使い、
+    風真いろはとして100〜200文字以内で答えてください。
+"""
+
+
+# =====================
+# サイズの記録
+# =====================
+class PromptStats:
+    """送ったプロンプトの文字数と、API が返したトークン数"""
+
+    def __init__(self):
+        self.requests = 0
+        self.chars = 0
+        self.max_chars = 0
+        self.last_chars = 0
+        # usageMetadata が返ってきた分だけ
+        self.usage_count = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.max_prompt_tokens = 0
+
+    def record_prompt(self, prompt: str):
+        size = len(prompt)
+        self.requests += 1
+        self.chars += size
+        self.last_chars = size
+        self.max_chars = max(self.max_chars, size)
+
+    def record_usage(self, usage: dict | None):
+        if not usage or "promptTokenCount" not in usage:
+            return
+        prompt_tokens = usage["promptTokenCount"]
+        self.usage_count += 1
+        self.prompt_tokens += prompt_tokens
+        self.output_tokens += usage.get("candidatesTokenCount", 0)
+        self.max_prompt_tokens = max(self.max_prompt_tokens, prompt_tokens)
+
+    def summary(self) -> dict:
+        return {
+            "requests": self.requests,
+            "avg_chars": self.chars // self.requests if self.requests else 0,
+            "max_chars": self.max_chars,
+            "last_chars": self.last_chars,
+            "avg_prompt_tokens": self.prompt_tokens // self.usage_count if self.usage_count else None,
+            "max_prompt_tokens": self.max_prompt_tokens if self.usage_count else None,
+            "avg_output_tokens": self.output_tokens // self.usage_count if self.usage_count else None,
+        }
+
+
+# =====================
+# プロンプト組み立て
+# =====================
+class PromptBuilder:
+    """
+    キャラクター設定（ai-image.txt）を読み込んでおき、ファイルが更新されたときだけ読み直す。
+    人物ごとの前半部分は組み立て済みのものを使い回し、毎回つなぐのは履歴と質問だけ
+    """
+
+    def __init__(self, persona_path: str):
+        self.persona_path = persona_path
+        self.stats = PromptStats()
+        self._mtime = None
+        self._persona = ""
+        self._heads: dict[str | None, str] = {}
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.persona_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+
+        with open(self.persona_path, "r", encoding="utf-8") as f:
+            self._persona = f.read().strip()
+        self._heads.clear()
+        self._mtime = mtime
+
+    def _head(self, name: str | None) -> str:
+        head = self._heads.get(name)
+        if head is None:
+            body = KNOWN_BODY.format(name=name) if name else UNKNOWN_BODY
+            head = self._heads[name] = f"\n    {self._persona}\n{body}\n    "
+        return head
+
+    def build(self, question: str, name: str | None, history: str = "") -> str:
+        """history は「これまでの会話」の文章（なければ空）"""
+        self._refresh()
+        return f"{self._head(name)}{history}\n    ユーザー: {question}\n    "
@@ -0,0 +1,149 @@
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import discord
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.cache import LRUCache
+
+# =====================
+# 設定
+# =====================
+FONT_PATH = "assets/Mplus2-Medium.ttf"
+FONT_SIZE = 24
+CARD_SIZE = (600, 200)
+CARD_BG = (30, 30, 30)
+AVATAR_SIZE = 100
+AVATAR_FETCH_SIZE = 128
+
+BOARD_WIDTH = 600
+BOARD_ROW_HEIGHT = 60
+BOARD_ICON_SIZE = 48
+
+AVATAR_CACHE_SIZE = 256  # デコード・リサイズ済みアイコン
+CARD_CACHE_SIZE = 128    # 完成したPNG
+
+
+# =====================
+# ランクカード描画
+# =====================
+class RankCardRenderer:
+    """フォント・背景を一度だけ読み込み、描画は専用スレッドで行う"""
+
+    def __init__(self, font_path: str = FONT_PATH):
+        self.font = ImageFont.truetype(font_path, FONT_SIZE)
+        self.base = Image.new("RGB", CARD_SIZE, CARD_BG)
+
+        self.avatars = LRUCache(AVATAR_CACHE_SIZE)
+        self.cards = LRUCache(CARD_CACHE_SIZE)
+
+        # フォントオブジェクトを共有するので描画スレッドは1本
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rank-card")
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ---- アイコン ----
+    @staticmethod
+    def _decode_avatar(data: bytes) -> Image.Image:
+        return Image.open(io.BytesIO(data)).convert("RGBA").resize((AVATAR_SIZE, AVATAR_SIZE))
+
+    async def get_avatar(self, user: discord.abc.User) -> Image.Image:
+        asset = user.display_avatar
+        avatar = self.avatars.get(asset.key)
+        if avatar is None:
+            data = await asset.with_static_format("png").with_size(AVATAR_FETCH_SIZE).read()
+            avatar = await self._run(self._decode_avatar, data)
+            self.avatars.put(asset.key, avatar)
+        return avatar
+
+    # ---- カード ----
+    def _draw_card(self, name: str, rank: str, messages: int, next_goal, position, avatar) -> bytes:
+        img = self.base.copy()
+        draw = ImageDraw.Draw(img)
+        font = self.font
+
+        # ユーザー名 & ランク
+        draw.text((150, 40), name, font=font, fill=(255, 255, 255))
+        draw.text((150, 80), f"ランク: {rank}", font=font, fill=(200, 200, 200))
+        if position:
+            draw.text((480, 40), f"#{position}", font=font, fill=(255, 215, 0))
+
+        # 発言数と進捗バー
+        if next_goal:
+            progress = min(messages / next_goal, 1)
+            bar_length = int(400 * progress)
+            draw.rectangle([150, 130, 150+bar_length, 150], fill=(0, 200, 0))
+            draw.rectangle([150, 130, 550, 150], outline=(255, 255, 255))
+            draw.text((150, 160), f"{messages}/{next_goal}", font=font, fill=(180, 180, 180))
+        else:
+            draw.text((150, 130), f"{messages} (MAX!)", font=font, fill=(255, 215, 0))
+
+        # アイコン描画
+        img.paste(avatar, (30, 50), avatar)
+
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    async def render_card(self, user: discord.abc.User, rank: str, messages: int, next_goal, position=None) -> io.BytesIO:
+        """ランクカードのPNGを返す（同じ内容ならキャッシュを使う）"""
+        # カードには発言数をそのまま描くので、発言数そのものを区切りとしてキーにする
+        key = (user.id, user.display_avatar.key, user.display_name, messages, position)
+        png = self.cards.get(key)
+        if png is None:
+            avatar = await self.get_avatar(user)
+            png = await self._run(self._draw_card, user.display_name, rank, messages, next_goal, position, avatar)
+            self.cards.put(key, png)
+        return io.BytesIO(png)
+
+    # ---- ランキング ----
+    async def _board_avatar(self, user):
+        return await self.get_avatar(user) if user else None
+
+    def _draw_leaderboard(self, rows) -> bytes:
+        img = Image.new("RGB", (BOARD_WIDTH, BOARD_ROW_HEIGHT * max(len(rows), 1)), CARD_BG)
+        draw = ImageDraw.Draw(img)
+        font = self.font
+        offset = (BOARD_ROW_HEIGHT - BOARD_ICON_SIZE) // 2
+
+        for i, (position, name, messages, avatar) in enumerate(rows):
+            top = i * BOARD_ROW_HEIGHT
+            color = (255, 215, 0) if position == 1 else (255, 255, 255)
+
+            draw.text((15, top + 16), f"#{position}", font=font, fill=color)
+            if avatar is not None:
+                icon = avatar.resize((BOARD_ICON_SIZE, BOARD_ICON_SIZE))
+                img.paste(icon, (85, top + offset), icon)
+            draw.text((150, top + 16), name, font=font, fill=(255, 255, 255))
+            draw.text((470, top + 16), f"{messages}", font=font, fill=(180, 180, 180))
+
+            if i:
+                draw.line([15, top, BOARD_WIDTH - 15, top], fill=(70, 70, 70))
+
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    async def render_leaderboard(self, entries) -> io.BytesIO:
+        """entries: (順位, ユーザー or None, 表示名, 発言数) のリスト"""
+        key = ("leaderboard",) + tuple(
+            (position, user.display_avatar.key if user else None, name, messages)
+            for position, user, name, messages in entries
+        )
+        png = self.cards.get(key)
+        if png is None:
+            # キャッシュにないアイコンは1ページ分まとめて取りに行く
+            avatars = await asyncio.gather(*(self._board_avatar(user) for _, user, _, _ in entries))
+            rows = [
+                (position, name, messages, avatar)
+                for (position, _, name, messages), avatar in zip(entries, avatars)
+            ]
+            png = await self._run(self._draw_leaderboard, rows)
+            self.cards.put(key, png)
+        return io.BytesIO(png)
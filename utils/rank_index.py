@@ -0,0 +1,146 @@
+INITIAL_SIZE = 1024  # 発言数の上限の初期値（超えたら倍に広げる）
+
+
+# =====================
+# Fenwick木
+# =====================
+class FenwickTree:
+    """1..size の位置ごとの件数。累積和と、累積がある値に達する位置を O(log n) で求める"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    @classmethod
+    def from_counts(cls, size: int, counts: dict[int, int]):
+        """{位置: 件数} から O(size) で作る"""
+        self = cls(size)
+        tree = self.tree
+        for i, count in counts.items():
+            tree[i] = count
+        for i in range(1, size + 1):
+            j = i + (i & -i)
+            if j <= size:
+                tree[j] += tree[i]
+        return self
+
+    def add(self, i: int, delta: int):
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        """位置 1..i の件数の合計"""
+        i = min(i, self.size)
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def lower_bound(self, target: int) -> int:
+        """prefix(i) >= target となる最小の i（target は1以上・合計以下）"""
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self.tree[nxt] < target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return pos + 1
+
+
+# =====================
+# 順位インデックス
+# =====================
+class RankIndex:
+    """
+    発言数ごとの人数を Fenwick木 で持ち、更新も順位も O(log n) で求める。
+    同じ発言数のユーザーは発言数ごとの集合に入れ、ページを作るときだけ user_id 順に並べる
+    """
+
+    def __init__(self):
+        self.counts: dict[int, int] = {}
+        # 発言数 -> その発言数のユーザー
+        self._buckets: dict[int, set[int]] = {}
+        self._tree = FenwickTree(INITIAL_SIZE)
+
+    def load(self, rows):
+        """(user_id, messages) の一覧から作り直す（0件のユーザーは除外）"""
+        self.counts = {user_id: messages for user_id, messages in rows if messages > 0}
+        self._buckets = {}
+        for user_id, messages in self.counts.items():
+            self._buckets.setdefault(messages, set()).add(user_id)
+        self._rebuild(max(self._buckets, default=0))
+
+    def _rebuild(self, messages: int):
+        size = INITIAL_SIZE
+        while size < messages:
+            size *= 2
+        self._tree = FenwickTree.from_counts(
+            size, {count: len(users) for count, users in self._buckets.items()}
+        )
+
+    def set(self, user_id: int, messages: int):
+        old = self.counts.get(user_id, 0)
+        if old == messages:
+            return
+
+        if old > 0:
+            users = self._buckets[old]
+            users.discard(user_id)
+            if not users:
+                del self._buckets[old]
+            self._tree.add(old, -1)
+
+        if messages > 0:
+            self.counts[user_id] = messages
+            self._buckets.setdefault(messages, set()).add(user_id)
+            if messages > self._tree.size:
+                self._rebuild(messages)
+            else:
+                self._tree.add(messages, 1)
+        else:
+            self.counts.pop(user_id, None)
+
+    def add(self, user_id: int, delta: int = 1):
+        self.set(user_id, self.counts.get(user_id, 0) + delta)
+
+    def position(self, user_id: int):
+        """順位（同数は同順位）。記録がなければ None"""
+        messages = self.counts.get(user_id, 0)
+        if messages <= 0:
+            return None
+        # 自分より発言数が多い人数 + 1
+        return len(self.counts) - self._tree.prefix(messages) + 1
+
+    def page(self, page: int, per_page: int) -> list[tuple[int, int, int]]:
+        """(順位, user_id, 発言数) のリスト。page は1始まり"""
+        total = len(self.counts)
+        start = (page - 1) * per_page
+        entries = []
+        if start >= total:
+            return entries
+
+        # start 番目の人がいる発言数と、それより上にいる人数
+        messages = self._tree.lower_bound(total - start)
+        above = total - self._tree.prefix(messages)
+        offset = start - above
+        while len(entries) < per_page:
+            users = sorted(self._buckets[messages])
+            for user_id in users[offset:offset + per_page - len(entries)]:
+                entries.append((above + 1, user_id, messages))
+            above += len(users)
+            offset = 0
+            if above >= total:
+                break
+            # 次に少ない発言数（それより下の人数 = total - above）
+            messages = self._tree.lower_bound(total - above)
+        return entries
+
+    def page_count(self, per_page: int) -> int:
+        return max(1, -(-len(self.counts) // per_page))
+
+    def __len__(self):
+        return len(self.counts)
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+# =====================
+# 設定
+# =====================
+# sqlite3 がコネクションごとにキャッシュするプリペアドステートメント数
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT = 5.0
+
+
+# =====================
+# DB1ファイル分
+# =====================
+class Database:
+    """1つのDBファイルに対する常駐コネクション（専用スレッドで直列実行）"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 専用スレッド1本で全アクセスを直列化するので check_same_thread は外す
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix=f"sqlite:{os.path.basename(path)}"
+        )
+        self._conn = sqlite3.connect(
+            path,
+            timeout=BUSY_TIMEOUT,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+
+    async def _submit(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    # ---- 同期処理（DBスレッド上で実行） ----
+    def _execute(self, sql, params):
+        with self._conn:
+            return self._conn.execute(sql, params).rowcount
+
+    def _executemany(self, sql, seq):
+        with self._conn:
+            return self._conn.executemany(sql, seq).rowcount
+
+    def _executescript(self, sql):
+        with self._conn:
+            self._conn.executescript(sql)
+
+    def _fetchone(self, sql, params):
+        return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params):
+        return self._conn.execute(sql, params).fetchall()
+
+    def _transaction(self, func, args):
+        with self._conn:
+            return func(self._conn, *args)
+
+    # ---- 非同期ファサード ----
+    async def execute(self, sql: str, params=()) -> int:
+        """書き込み1文を実行してコミットする（影響行数を返す）"""
+        return await self._submit(self._execute, sql, params)
+
+    async def executemany(self, sql: str, seq) -> int:
+        """同じ文をまとめて1トランザクションで実行する"""
+        return await self._submit(self._executemany, sql, list(seq))
+
+    async def executescript(self, sql: str):
+        """CREATE TABLE などの複数文スクリプトを実行する"""
+        await self._submit(self._executescript, sql)
+
+    async def fetchone(self, sql: str, params=()):
+        return await self._submit(self._fetchone, sql, params)
+
+    async def fetchall(self, sql: str, params=()) -> list:
+        return await self._submit(self._fetchall, sql, params)
+
+    async def transaction(self, func, *args):
+        """func(conn, *args) を1トランザクション内で実行する"""
+        return await self._submit(self._transaction, func, args)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._conn.close()
+
+
+# =====================
+# Bot全体で共有するストレージ
+# =====================
+class Storage:
+    """DBファイルごとに常駐コネクションを保持する（MyBot.storage）"""
+
+    def __init__(self):
+        self._databases: dict[str, Database] = {}
+
+    def get(self, path: str) -> Database:
+        key = os.path.abspath(path)
+        db = self._databases.get(key)
+        if db is None:
+            db = Database(path)
+            self._databases[key] = db
+        return db
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        for db in self._databases.values():
+            # 実行中のクエリを待ってから閉じる
+            await loop.run_in_executor(None, db.close)
+        self._databases.clear()
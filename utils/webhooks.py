@@ -0,0 +1,124 @@
+import asyncio
+from collections import deque
+
+import aiohttp
+import discord
+
+# =====================
+# 設定
+# =====================
+RETRY_LIMIT = 2         # 通信エラーで送れなかったときの再試行回数
+RETRY_BASE_DELAY = 1.0  # 再試行の待ち時間（秒、回数ごとに倍）
+
+
+class WebhookJob:
+    """送信待ちの1件"""
+
+    def __init__(self, kwargs: dict, merge_key, future: asyncio.Future):
+        self.kwargs = kwargs
+        self.merge_key = merge_key
+        self.futures = [future]
+
+
+# =====================
+# Webhook送信キュー
+# =====================
+class WebhookDispatcher:
+    """
+    Webhook URL ごとに1本のキューで順番に送る（MyBot.webhooks）
+    - discord.Webhook は URL ごとに使い回す（レート制限の待ち合わせは discord.py 側が行う）
+    - 5xx・429 は discord.py 側が再試行済みなのでそのまま失敗にし、通信エラーだけ少し再試行する
+    - 同じ merge_key の通知が溜まったら1通にまとめて「（n件）」を付ける
+    """
+
+    def __init__(self, session: aiohttp.ClientSession):
+        self.session = session
+        self._webhooks: dict[str, discord.Webhook] = {}
+        self._queues: dict[str, deque[WebhookJob]] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+        self.metrics = {"sent": 0, "merged": 0, "retries": 0, "failed": 0}
+
+    def webhook(self, url: str) -> discord.Webhook:
+        webhook = self._webhooks.get(url)
+        if webhook is None:
+            webhook = self._webhooks[url] = discord.Webhook.from_url(url, session=self.session)
+        return webhook
+
+    def post(self, url: str, *, merge_key=None, **kwargs) -> asyncio.Future:
+        """
+        送信をキューに入れて Future を返す（待たなくてよい）。
+        kwargs は discord.Webhook.send にそのまま渡す。wait=True なら結果は WebhookMessage
+        """
+        future = asyncio.get_running_loop().create_future()
+        # 誰も待たなかった失敗で警告が出ないようにする（失敗はワーカー側で表示済み）
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        queue = self._queues.setdefault(url, deque())
+        if merge_key is not None:
+            for job in queue:
+                if job.merge_key == merge_key:
+                    job.futures.append(future)
+                    self.metrics["merged"] += 1
+                    return future
+        queue.append(WebhookJob(kwargs, merge_key, future))
+
+        if url not in self._workers:
+            self._workers[url] = asyncio.create_task(self._worker(url))
+        return future
+
+    async def send(self, url: str, *, merge_key=None, **kwargs):
+        """送信が終わるまで待つ版の post()"""
+        return await self.post(url, merge_key=merge_key, **kwargs)
+
+    async def _worker(self, url: str):
+        queue = self._queues[url]
+        try:
+            while queue:
+                job = queue.popleft()
+                kwargs = job.kwargs
+                count = len(job.futures)
+                if count > 1 and kwargs.get("content"):
+                    kwargs = dict(kwargs, content=f"{kwargs['content']}（{count}件）")
+
+                try:
+                    result = await self._send_with_retry(url, kwargs)
+                except Exception as e:
+                    self.metrics["failed"] += 1
+                    print(f"❌ Webhook送信失敗: {e}")
+                    for future in job.futures:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                self.metrics["sent"] += 1
+                for future in job.futures:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            # キューが空になったらワーカーは終了（次の post() で作り直す）
+            del self._workers[url]
+            if not queue:
+                del self._queues[url]
+
+    async def _send_with_retry(self, url: str, kwargs: dict):
+        webhook = self.webhook(url)
+        for attempt in range(RETRY_LIMIT + 1):
+            # タイムアウトは届いている可能性があり、送り直すと二重投稿になるので再試行しない
+            try:
+                return await webhook.send(**kwargs)
+            except asyncio.TimeoutError:
+                raise
+            except (aiohttp.ClientError, OSError):
+                if attempt == RETRY_LIMIT:
+                    raise
+            self.metrics["retries"] += 1
+            await asyncio.sleep(RETRY_BASE_DELAY * 2 ** attempt)
+
+    async def close(self, timeout: float = 5.0):
+        """送信待ちを少しだけ待ってから止める"""
+        workers = list(self._workers.values())
+        if not workers:
+            return
+        _, pending = await asyncio.wait(workers, timeout=timeout)
+        for task in pending:
+            task.cancel()